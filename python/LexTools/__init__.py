@@ -0,0 +1,67 @@
+'''
+LexTools: utilities for scripting, logging and data processing
+
+Submodules are imported on first use (PEP 562) so `import LexTools` is
+near-instant and the 3rd party packages a submodule needs (e.g. yaml, psutil,
+numpy) are only imported with it.
+
+Modules import their siblings relatively when imported from the package and
+by name when __package__ is empty, i.e. when run as scripts from the
+LexTools directory (e.g. `python example_script.py`).
+
+How to use:
+```
+import LexTools
+cfg = LexTools.scripting.read_config(path) # Imports LexTools.scripting
+```
+'''
+# Standard library
+import importlib
+
+# Globals
+_SUBMODULES = {
+    'array_cache',
+    'file_utils',
+    'git',
+    'gpu_utils',
+    'logging_utils',
+    'notebooks',
+    'package_exploration',
+    'path_lock',
+    'pipeline',
+    'profiling',
+    'progress_bar',
+    'pytools',
+    'resource_monitor',
+    'result_writer',
+    'run_cache',
+    'scripting',
+    'sharding',
+    'stopwatch',
+    'string_tools',
+    'user_input',
+    'yaml_utils',
+}
+# Functions and classes available at the top level, name -> submodule
+_ATTRIBUTES = {
+    'get_nth_digit' : 'pytools',
+    'join_ints'     : 'pytools',
+    'ndigits'       : 'pytools',
+    'pop_digit'     : 'pytools',
+    'split_int'     : 'pytools',
+}
+
+################################################################################
+def __getattr__(name: str):
+    if name in _SUBMODULES:
+        value = importlib.import_module(f'.{name}', __name__)
+    elif name in _ATTRIBUTES:
+        module = importlib.import_module(f'.{_ATTRIBUTES[name]}', __name__)
+        value = getattr(module, name)
+    else:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    globals()[name] = value # Later lookups skip __getattr__
+    return value
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | _SUBMODULES | set(_ATTRIBUTES))
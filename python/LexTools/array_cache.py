@@ -0,0 +1,154 @@
+'''
+Cache of decoded arrays (e.g. images) saved as memory-mappable .npy files
+
+Decoding compressed inputs is often the slowest step of re-running a script
+with different settings. ArrayCache saves each decoded array once, keyed by
+the input's path, size and modification time along with the decoding
+options, and later runs memory map the saved array instead of decoding. The
+operating system page cache then shares the data between runs and processes
+without copies.
+
+How to use:
+```
+cache = ArrayCache(cache_dir, max_bytes=50e9)
+img = cache.load(path, read_image, color_mode='RGB')
+...
+cache.evict()
+```
+'''
+# Standard library
+import hashlib
+import logging
+import os
+from pathlib import Path
+from typing import Callable, Optional
+
+# 3rd party
+import numpy as np
+
+# Local
+if __package__:
+    from . import file_utils, run_cache
+else:
+    import file_utils
+    import run_cache
+
+# Globals
+log = logging.getLogger(__name__)
+
+################################################################################
+class ArrayCache:
+    '''Directory of decoded arrays with least recently used eviction
+
+    Parameters
+    ==========
+    cache_dir:
+        Directory holding the cache, which can be shared by many processes
+    max_bytes:
+        Total size above which evict() removes least recently used arrays
+    '''
+    def __init__(self, cache_dir: Path, max_bytes: Optional[float] = None):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def load(self, path: Path, decode: Callable, **kwargs) -> np.ndarray:
+        '''Memory map the cached array of path or decode and cache it
+
+        decode(path, **kwargs) must return a numpy array with a non-object
+        dtype. The returned memory map is read-only.
+        '''
+        opath = self._cache_path(path, kwargs)
+        try:
+            arr = np.load(opath, mmap_mode='r')
+        except FileNotFoundError:
+            pass
+        else:
+            try:
+                os.utime(opath) # Mark as recently used
+            except OSError:
+                pass
+            return arr
+
+        arr = np.asarray(decode(path, **kwargs))
+        opath.parent.mkdir(exist_ok=True)
+        # Other processes never map incomplete files and threads may decode
+        # the same input at once
+        with file_utils.atomic_path(opath, exist_ok=True) as tmp_path:
+            np.save(tmp_path, arr, allow_pickle=False)
+        return arr
+
+    def _cache_path(self, path: Path, kwargs: dict) -> Path:
+        path = Path(path).resolve()
+        stat = path.stat()
+        key = run_cache.canonical_json([str(path), stat.st_size, stat.st_mtime_ns, kwargs])
+        key_hash = hashlib.sha256(key.encode()).hexdigest()
+        # Subdirectories keep directory listings short for millions of inputs
+        return self.cache_dir/key_hash[:2]/f'{key_hash}.npy'
+
+    def evict(self) -> None:
+        '''Remove least recently used arrays until below max_bytes'''
+        if self.max_bytes is None:
+            return
+        entries = []
+        for subdir in self.cache_dir.iterdir():
+            if not subdir.is_dir():
+                continue
+            with os.scandir(subdir) as files:
+                for entry in files:
+                    if entry.name.endswith('.npy'):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort() # Least recently used first
+
+        total_bytes = sum(size for _, size, _ in entries)
+        n_evicted = 0
+        for _, size, path in entries:
+            if total_bytes <= self.max_bytes:
+                break
+            # Processes still mapping the file keep their data until unmapped
+            Path(path).unlink(missing_ok=True)
+            total_bytes -= size
+            n_evicted += 1
+        if n_evicted:
+            log.debug('Evicted %d cached arrays from %s', n_evicted, self.cache_dir)
+
+################################################################################
+# PyTests to be moved into tests/ if added to project
+def test_array_cache(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+    image = tmp_path/'image.txt'
+    image.write_text('1 2 3')
+    calls = []
+    def decode(path, scale=1):
+        calls.append(path)
+        return np.array(path.read_text().split(), dtype=np.uint8) * scale
+
+    cache = ArrayCache(tmp_path/'cache')
+    arr = cache.load(image, decode, scale=2)
+    cached = cache.load(image, decode, scale=2)
+    assert isinstance(cached, np.memmap) and not cached.flags.writeable
+    np.testing.assert_array_equal(arr, cached)
+    assert len(calls) == 1
+
+    # Different decoding options or a modified input are decoded again
+    cache.load(image, decode, scale=3)
+    assert len(calls) == 2
+    image.write_text('4 5 6 7')
+    np.testing.assert_array_equal(cache.load(image, decode, scale=2), [8, 10, 12, 14])
+    assert len(calls) == 3
+
+    # Each array file has a 128 byte header so only the newest fits
+    n_files = lambda: len(list((tmp_path/'cache').glob('*/*.npy')))
+    assert n_files() == 3
+    ArrayCache(tmp_path/'cache', max_bytes=200).evict()
+    assert n_files() == 1
+    cache.load(image, decode, scale=2)
+    assert len(calls) == 3
+
+    # Threads decoding the same input at once
+    cache = ArrayCache(tmp_path/'cache2')
+    with ThreadPoolExecutor(8) as pool:
+        arrs = list(pool.map(lambda _: cache.load(image, decode), range(32)))
+    assert all(np.array_equal(arr, [4, 5, 6, 7]) for arr in arrs)
+    assert len(list((tmp_path/'cache2').glob('*/*'))) == 1
@@ -10,97 +10,329 @@ options, multiple inputs and outputs, and a need for reproducibility.
 
 # Standard library
 import argparse
+from collections.abc import Mapping
+from concurrent.futures import Future
+import contextlib
+import functools
 import logging
 from pathlib import Path
 import os
-from copy import deepcopy
 import pprint
+import subprocess
+from typing import Optional
 
 # 3rd party
-import yaml
+import numpy as np
 
 # Local
-import scripting
-import git
-import logging_utils
+if __package__:
+    from . import (
+        array_cache, git, scripting, logging_utils, pipeline, profiling,
+        result_writer, run_cache, sharding,
+    )
+    from .stopwatch import stopwatch
+else:
+    import array_cache
+    import git
+    import scripting
+    import logging_utils
+    import pipeline
+    import profiling
+    import result_writer
+    import run_cache
+    import sharding
+    from stopwatch import stopwatch
 
 # Globals
 log = logging.getLogger(__name__)
 PACKAGE_DIR = Path(__file__).parents[1]
 DEFAULT_CFG = PACKAGE_DIR/'tests/test_example_script/inputs/config_default.yml'
 
+# Layout, types and valid values of the configuration (see
+# scripting.compile_schema). Unknown keys are errors unless allowed by `...`
+CONFIG_SCHEMA = {
+    'inputs' : {
+        'image_dir'     : str,
+        'image_suffix'  : str,
+        'color_mode'    : {'RGB', 'BGR', 'GRAYSCALE', 'UNCHANGED'},
+        'decoded_cache' : ({
+            'dir'       : str,
+            'max_bytes' : (int, float, None),
+        }, None),
+    },
+    'outputs' : {
+        'dir'          : str,
+        'overwrite'    : bool,
+        'scores_fname' : (str, None),
+        'flush_every'  : int,
+        'debug_images' : ([str], None),
+        'run_cache' : ({
+            'dir'          : str,
+            'max_age_days' : (int, float, None),
+            'max_bytes'    : (int, float, None),
+        }, None),
+        'logging' : {
+            'fileConfig'              : (str, None),
+            'dictConfig'              : (Mapping, None),
+            'background'              : bool,
+            'rate_limit'              : (Mapping, None),
+            'debug_buffer'            : (int, None),
+            'capture_version_control' : bool,
+            'monitor_resources'       : (Mapping, None),
+            # logging.basicConfig() kwargs
+            'format'                  : str,
+            'level'                   : (str, int),
+            'force'                   : bool,
+            'filename'                : (str, None),
+            'filemode'                : str,
+        },
+        'profiling' : {
+            'cprofile'        : bool,
+            'top_n'           : int,
+            'stopwatch'       : bool,
+            'sample_interval' : (int, float, None),
+        },
+    },
+    'execution' : {
+        'executor'     : {'serial', 'thread', 'process'},
+        'workers'      : (int, None),
+        'chunksize'    : int,
+        'batch_size'   : int,
+        'read_workers' : int,
+        'prefetch'     : int,
+    },
+    # Keyword arguments of preprocess() and compute_scores()
+    'preprocessing' : {'kwarg1' : object, 'kwarg2' : object},
+    'scoring'       : {'kwarg1' : object, 'kwarg2' : object},
+}
+
 ################################################################################
 def main():
+    stopwatch.start('setup')
     validate_environment()
 
     # Load and merge all user configuration options
     args = parse_argv()
     default_cfg = scripting.read_config(DEFAULT_CFG)
     cfgs = [scripting.read_config(Path(p)) for p in args.configs] 
-    cfg = scripting.merge_config_files(cfgs, default_cfg)
-    cfg = override_config(cfg, args)
-    cfg = reformat_config(cfg)
+    cfg = scripting.LayeredConfig(default_cfg, *cfgs)
+    cfg = cfg.new_child(override_config(cfg, args))
     validate_config(cfg)
+    cfg = reformat_config(cfg.to_dict())
     
     # Get common configuration sections and parameters
     icfg = cfg['inputs']
     ocfg = cfg['outputs']
     odir = Path(ocfg['dir'])
 
+    if args.merge:
+        logging_utils.configure_logging(output_dir=odir, **ocfg['logging'])
+        if ocfg['scores_fname'] is None:
+            raise ValueError('outputs.scores_fname is required to merge shards')
+        sharding.merge_shards(odir, ocfg['scores_fname'], key='image')
+        stopwatch.stop('setup')
+        log.info('*** Program finished ***')
+        return
+    if args.shard is not None:
+        odir = sharding.shard_dir(odir, *args.shard)
+
     # Setup
-    scripting.require_empty_dir(odir, ocfg['overwrite'])
+    previous_deleted = None
+    if args.resume:
+        odir.mkdir(parents=True, exist_ok=True)
+    else:
+        # Previous outputs are deleted in the background while running. If the
+        # run exits first, the rest is left in a hidden .<name>.deleting-*
+        # sibling of odir that the next run deletes.
+        previous_deleted = scripting.require_empty_dir(
+            odir, parents=True, overwrite=ocfg['overwrite'], background_delete=True
+        )
+    diff_path = odir/'git_diff.patch'
+    vc_capture = logging_utils.start_version_control_capture(diff_path=diff_path)
     logging_utils.configure_logging(output_dir=odir, **ocfg['logging'])
     log.debug('Logging Summary:\n%s', logging_utils.summarize_logging())
+    profiler = profiling.Profiler(odir, **ocfg['profiling'])
+    profiler.start()
 
     # Reproducibility
     log.debug('Final configuration:\n%s', pprint.pformat(cfg, indent=4))
     opath = odir/'config.yml'
-    yaml.safe_dump(cfg, opath.open('w'))
+    if args.resume and opath.is_file() and scripting.read_config(opath) != cfg:
+        log.warning('Configuration differs from the run being resumed: %s', opath)
+    scripting.save_config(cfg, opath)
     log.info('Final configuration saved: %s', opath)
     
     log.info('Version Control Summary:\n%s', logging_utils.summarize_version_control())
-    opath = odir/'git_diff.patch'
-    opath.write_text(git.get_diff())
-    log.info('Git diff patch saved: %s', opath)
+    log.info('Git diff patch saved: %s', diff_path)
 
     # NOTE: The following is dependent on use-case so most of the details are
     # just for illustration.
 
-    # Run
     img_dir = Path(icfg['image_dir'])
     img_suffix = icfg['image_suffix']
-    scores = []
-    for path in img_dir.glob(f'*{img_suffix}'):
-        img = read_image(path, icfg['color_mode'])
-        preprocessed_img = preprocess(img, **cfg['preprocessing'])
+    paths = sorted(img_dir.glob(f'*{img_suffix}'))
+    if args.shard is not None:
+        n_paths = len(paths)
+        paths = sharding.shard_items(paths, *args.shard)
+        log.info('Shard %d/%d: %d of %d images', *args.shard, len(paths), n_paths)
+    scores_path = None
+    if ocfg['scores_fname'] is not None:
+        scores_path = odir/ocfg['scores_fname']
 
-        if ocfg['debug_images'] and path.name in ocfg['debug_images']:
-            save_image(preprocessed_img, odir / f'preprocessed_{path.name}')
-            log.debug('Saved preprocessed image: %s', path.name)
+    # Reuse outputs of an identical previous run
+    cache, run_key = None, None
+    if ocfg['run_cache'] is not None and not args.resume:
+        cache_cfg = ocfg['run_cache']
+        max_age_days = cache_cfg['max_age_days']
+        cache = run_cache.RunCache(
+            Path(cache_cfg['dir']).expanduser(),
+            max_age = None if max_age_days is None else max_age_days * 86400,
+            max_bytes = cache_cfg['max_bytes'],
+        )
+        # Outputs and caches written in the repository are not code
+        exclude = [Path(ocfg['dir']), cache.cache_dir]
+        if icfg['decoded_cache'] is not None:
+            exclude.append(Path(icfg['decoded_cache']['dir']).expanduser())
+        run_key = get_run_key(cfg, vc_capture, diff_path, paths, exclude)
+        if run_key is not None and cache.restore(run_key, odir):
+            log.info('Outputs restored from run cache: %s', cache.cache_dir)
+            if args.shard is not None:
+                sharding.write_manifest(
+                    odir, *args.shard, [p.name for p in paths], ocfg['scores_fname']
+                )
+            if previous_deleted is not None:
+                previous_deleted.result()
+            stopwatch.stop('setup')
+            profiler.stop()
+            log.info('*** Program finished ***')
+            return
 
-        score = compute_score(preprocessed_img, **cfg['scoring'])
-        scores.append(score)
+    # Skip images scored before a crash
+    todo = paths
+    if args.resume and scores_path is not None and scores_path.exists():
+        done = {row['image'] for row in result_writer.read_rows(scores_path)}
+        todo = [path for path in paths if path.name not in done]
+        log.info('Resuming with %d of %d images already scored', len(done), len(paths))
 
-    # Save outputs
-    if ocfg['scores_fname'] is not None:
-        opath = odir/ocfg['scores_fname']
-        save_scores(scores, opath)
-        log.info('Output scores saved: %s', opath)
+    stopwatch.stop('setup')
+
+    # Run
+    debug_images = set(ocfg['debug_images'] or ())
+    decoded_cache = None
+    if icfg['decoded_cache'] is not None:
+        decoded_cache = array_cache.ArrayCache(
+            Path(icfg['decoded_cache']['dir']).expanduser(),
+            max_bytes = icfg['decoded_cache']['max_bytes'],
+        )
+    read = functools.partial(
+        read_images, color_mode=icfg['color_mode'], cache=decoded_cache
+    )
+    task = functools.partial(
+        score_images,
+        preprocessing = cfg['preprocessing'],
+        scoring = cfg['scoring'],
+        debug_dir = odir,
+        debug_images = debug_images,
+    )
+    ecfg = cfg['execution']
+    size = ecfg['batch_size']
+    batches = [todo[i:i+size] for i in range(0, len(todo), size)]
+    # Decode the next batches in background threads while scoring
+    decoded = pipeline.prefetch(read, batches, ecfg['read_workers'], ecfg['prefetch'])
+    results = scripting.parallel_map(
+        task, decoded, ecfg['executor'], ecfg['workers'], ecfg['chunksize']
+    )
+
+    # Save outputs as they are computed so a crash does not lose them
+    writer = contextlib.nullcontext()
+    if scores_path is not None:
+        writer = result_writer.open_writer(
+            scores_path, ['image', 'score'], ocfg['flush_every'], append=args.resume
+        )
+    stopwatch.start('run')
+    with writer:
+        for rows in results:
+            if scores_path is not None:
+                stopwatch.start('run/write_scores')
+                writer.write_rows(rows)
+                stopwatch.stop('run/write_scores')
+    stopwatch.stop('run')
+
+    stopwatch.start('finish')
+    outputs = [f'preprocessed_{p.name}' for p in paths if p.name in debug_images]
+    if scores_path is not None:
+        outputs.append(ocfg['scores_fname'])
+        log.info('Output scores saved: %s', scores_path)
+    if decoded_cache is not None:
+        decoded_cache.evict()
+
+    if args.shard is not None:
+        sharding.write_manifest(
+            odir, *args.shard, [p.name for p in paths], ocfg['scores_fname']
+        )
+        log.info('Shard finished. Merge all shards with --merge -o %s', odir.parent)
 
+    if run_key is not None:
+        cache.store(run_key, odir, outputs)
+        cache.evict()
+    if previous_deleted is not None:
+        previous_deleted.result()
+    stopwatch.stop('finish')
+
+    profiler.stop()
     log.info('*** Program finished ***')
 
 ################################################################################
 # Main business logic
+def read_images(paths, color_mode, cache=None):
+    '''Read a batch of images, run in background threads by pipeline.prefetch()
+
+    Images in a batch must have the same shape. Decoded images are memory
+    mapped from the array_cache.ArrayCache if provided. A batch of one image
+    is a view of the memory map, while larger batches are copied into one
+    array.
+    '''
+    if cache is None:
+        imgs = [read_image(path, color_mode) for path in paths]
+    else:
+        imgs = [cache.load(path, read_image, color_mode=color_mode) for path in paths]
+    if len(imgs) == 1:
+        return paths, imgs[0][np.newaxis]
+    return paths, np.stack(imgs)
+
+def score_images(decoded, preprocessing, scoring, debug_dir, debug_images):
+    '''Score a batch from read_images() with one vectorized call per step
+
+    Run in parallel by scripting.parallel_map(). Decoded images are pickled to
+    the workers of the process executor so the thread executor is usually
+    faster, as NumPy releases the GIL.
+    '''
+    paths, batch = decoded
+    preprocessed = preprocess(batch, **preprocessing)
+
+    for path, preprocessed_img in zip(paths, preprocessed):
+        if path.name in debug_images:
+            save_image(preprocessed_img, debug_dir / f'preprocessed_{path.name}')
+            log.debug('Saved preprocessed image: %s', path.name)
+
+    scores = compute_scores(preprocessed, **scoring).tolist()
+    return [{'image' : path.name, 'score' : score} for path, score in zip(paths, scores)]
+
 def read_image(path, color_mode):
-    return [[1,2,3],[4,5,6],[7,8,9]]
-def preprocess(img, kwarg1 = None, kwarg2 = None):
-    return [[pixel/255 for pixel in row] for row in img]
+    return np.array([[1,2,3],[4,5,6],[7,8,9]], dtype=np.uint8)
+def preprocess(img, kwarg1 = None, kwarg2 = None, out = None):
+    # Works on single images and batches. Dividing in float64 with an output
+    # dtype converts and scales in one pass, giving the same values as pixel/255.
+    return np.divide(img, 255, out=out, dtype=np.float64)
 def compute_score(img, kwarg1=None, kwarg2=None, **kwargs):
-    return sum(sum(row) for row in img)
+    # Summing rows then row sums agrees with sum(sum(row) for row in img) to
+    # rounding (exactly for short rows, as NumPy sums long rows pairwise)
+    return float(img.sum(axis=-1).sum())
+def compute_scores(batch, kwarg1=None, kwarg2=None, **kwargs):
+    # compute_score() of each image stacked along the first axis
+    return batch.sum(axis=-1).reshape(len(batch), -1).sum(axis=1)
 def save_image(img, opath):
     opath.write_text(str(img))
-def save_scores(scores, opath):
-    opath.write_text(str(scores))
 
 ################################################################################
 # Scripting functions that do not generalize well beyond this file
@@ -135,28 +367,82 @@ def parse_argv() -> argparse.Namespace:
         choices = ('CRITICAL', 'ERROR', 'WARNING', 'INFO', 'DEBUG'),
         help = 'Root logging level',
     )
+    parser.add_argument(
+        '--shard',
+        type = sharding.parse_shard,
+        metavar = 'i/N',
+        help = 'Only process the i-th of N contiguous shards of the sorted '
+               'inputs (0-based), saving outputs in a shard subdirectory',
+    )
+    parser.add_argument(
+        '--merge',
+        action = 'store_true',
+        help = 'Validate and merge the scores of all finished shards',
+    )
+    parser.add_argument(
+        '--resume',
+        action = 'store_true',
+        help = 'Continue a crashed run in its output directory, '
+               'skipping images that were already scored',
+    )
     return parser.parse_args()
 
-def override_config(
-    cfg: dict, 
-    args: argparse.Namespace, 
-    copy: bool = True
-) -> dict:
-    '''Override configuration settings with command line arguments'''
-    if copy:
-        cfg = deepcopy(cfg)
+def override_config(cfg: Mapping, args: argparse.Namespace) -> dict:
+    '''Configuration layer overriding settings with command line arguments'''
+    overrides = {'inputs' : {}, 'outputs' : {}}
     if args.input:
-        cfg['inputs']['image_dir'] = str(args.input)
+        overrides['inputs']['image_dir'] = str(args.input)
     if args.odir:
-        cfg['outputs']['dir'] = str(args.odir)
+        overrides['outputs']['dir'] = str(args.odir)
     if args.log_level:
         log_cfg = cfg['outputs']['logging']
+        log_overrides = overrides['outputs']['logging'] = {}
         if 'level' in log_cfg:
-            log_cfg['level'] = args.log_level
-        log_cfg = log_cfg['dictConfig']
-        if  log_cfg is not None and log_cfg.get('root'):
-            log_cfg['root']['level'] = args.log_level
-    return cfg
+            log_overrides['level'] = args.log_level
+        dict_cfg = log_cfg['dictConfig']
+        if dict_cfg is not None and dict_cfg.get('root'):
+            log_overrides['dictConfig'] = {'root' : {'level' : args.log_level}}
+    return overrides
+
+def get_run_key(
+    cfg: dict,
+    vc_capture: Future,
+    diff_path: Path,
+    input_paths: list[Path],
+    exclude: list[Path] = (),
+) -> Optional[str]:
+    '''Hash of everything that changes the outputs, or None if unknown
+
+    Outputs depend on the configuration, the code (commit hash, diff of
+    staged and unstaged changes and contents of untracked files outside the
+    exclude directories) and the inputs.
+    '''
+    ocfg = cfg['outputs']
+    run_cfg = {k : v for k, v in cfg.items() if k != 'execution'}
+    run_cfg['inputs'] = {
+        k : v for k, v in cfg['inputs'].items() if k != 'decoded_cache'
+    }
+    run_cfg['outputs'] = {
+        'scores_fname' : ocfg['scores_fname'],
+        'debug_images' : ocfg['debug_images'],
+    }
+    try:
+        snap = vc_capture.result()
+    except (subprocess.CalledProcessError, OSError) as err:
+        log.warning('Run cache disabled without version control state: %s', err)
+        return None
+    git_state = [snap.hash, snap.dirty]
+    if snap.dirty:
+        git_state.append(run_cache.hash_file(diff_path))
+    # Always hashed, and previous outputs being deleted in the background
+    # skipped, so untracked outputs of earlier runs do not change the key
+    repo_dir = git.default_working_dir()
+    untracked = [
+        repo_dir/path for path in snap.untracked
+        if not scripting.is_trash_dir(repo_dir/path)
+    ]
+    git_state.append(run_cache.hash_paths(untracked, exclude=exclude))
+    return run_cache.run_key(run_cfg, git_state, input_paths)
 
 def reformat_config(cfg: dict) -> dict:
     '''Reformat and/or update configuration
@@ -197,31 +483,40 @@ def reformat_config(cfg: dict) -> dict:
 
     return cfg
 
-def validate_config(cfg: dict) -> None:
+_validate_schema = scripting.compile_schema(CONFIG_SCHEMA)
+
+def validate_config(cfg: Mapping) -> None:
     '''Validate values in configuration now before they cause problems later'''
     # NOTE: It is not important to check for every error but often there are
     # some common user errors that may lead to confusing error messages or not
     # cause issues until later in the program (e.g. typo in an output path). For
     # long-running programs, it can be much more convenient to notice these
     # errors right away and provide helpful errors messages.
-   
+
+    # Check layout, types and values, reporting all errors at once
+    _validate_schema(cfg)
 
     # Check for valid paths
     odir = Path(cfg['outputs']['dir'])
     if not odir.parent.is_dir():
         raise FileNotFoundError(odir.parent)
 
-    # Check for valid values
-    valid_color_modes = ('RGB', 'BGR', 'GRAYSCALE', 'UNCHANGED')
-    if cfg['inputs']['color_mode'] not in valid_color_modes:
-        cm = cfg['inputs']['color_mode'] 
-        raise ValueError(f'color_mode {cm}. Choose from {valid_color_modes}')
-
-    # Check for valid types
-    if not isinstance(cfg['outputs']['overwrite'], bool):
-        t = type(cfg['outputs']['overwrite'])
-        raise TypeError(f'Overwrite flag must be bool: {t}')
-   
+    # Check for supported output formats
+    scores_fname = cfg['outputs']['scores_fname']
+    if scores_fname is not None:
+        if Path(scores_fname).suffix not in result_writer.SUFFIXES:
+            raise ValueError(
+                f'outputs.scores_fname: expected one of '
+                f'{", ".join(result_writer.SUFFIXES)}, got {scores_fname}'
+            )
+
+    # Resource use is sampled by at most one monitor
+    if (cfg['outputs']['profiling']['sample_interval'] is not None
+            and cfg['outputs']['logging']['monitor_resources'] is not None):
+        raise scripting.ConfigError([
+            'outputs.profiling.sample_interval: cannot be combined with '
+            'outputs.logging.monitor_resources, set only one'
+        ])
 
 if __name__ == '__main__':
     main()
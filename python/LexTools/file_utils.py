@@ -0,0 +1,117 @@
+'''
+Writing files and directories atomically and removing them
+
+Outputs shared between threads and processes (caches, manifests, result
+files) are written to a temporary path next to their final path and renamed
+into place, so readers never see partial outputs. Renaming within a file
+system is atomic and each writer gets its own temporary path, so concurrent
+writers of the same output never collide.
+
+How to use:
+```
+with atomic_path(opath) as tmp_path:
+    tmp_path.write_bytes(data) # Or any writer taking a path
+remove(opath)
+```
+'''
+# Standard library
+from contextlib import contextmanager
+import os
+from pathlib import Path
+import shutil
+import tempfile
+from typing import Iterator
+
+################################################################################
+@contextmanager
+def atomic_path(path: Path, exist_ok: bool = False) -> Iterator[Path]:
+    '''Temporary path to write instead of path, moved to path on success
+
+    The temporary path has the same name as path, keeping the suffix for
+    writers that choose the format by suffix, inside a unique hidden
+    directory next to path. It is removed if the block raises. A directory
+    replacing path deletes the previous path first, which is not atomic.
+
+    Parameters
+    ==========
+    path:
+        Final file or directory path
+    exist_ok:
+        Keep path if it exists and cannot be replaced (e.g. a directory, or a
+        file open on Windows) instead of raising. For caches where the output
+        of any writer is valid.
+    '''
+    path = Path(path)
+    tmp_dir = Path(tempfile.mkdtemp(dir=path.parent, prefix=f'.{path.name}.', suffix='.tmp'))
+    tmp_path = tmp_dir/path.name
+    try:
+        yield tmp_path
+        if tmp_path.is_dir() and not exist_ok:
+            remove(path)
+        try:
+            os.replace(tmp_path, path)
+        except OSError:
+            if not (exist_ok and path.exists()):
+                raise
+    finally:
+        remove(tmp_dir)
+
+def remove(path: Path) -> None:
+    '''Remove a file or directory tree if it exists, without following symlinks'''
+    path = Path(path)
+    if path.is_dir() and not path.is_symlink():
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        path.unlink(missing_ok=True)
+
+################################################################################
+# PyTests to be moved into tests/ if added to project
+def test_atomic_path(tmp_path):
+    import pytest
+    opath = tmp_path/'out.txt'
+    with atomic_path(opath) as tmp:
+        assert tmp.name == opath.name and tmp.parent.parent == tmp_path
+        tmp.write_text('A')
+        assert not opath.exists()
+    assert opath.read_text() == 'A'
+    with atomic_path(opath) as tmp:
+        tmp.write_text('B')
+    assert opath.read_text() == 'B'
+    assert list(tmp_path.iterdir()) == [opath]
+
+    # Nothing is written if the block fails
+    with pytest.raises(ValueError):
+        with atomic_path(opath) as tmp:
+            tmp.write_text('C')
+            raise ValueError
+    assert opath.read_text() == 'B'
+    assert list(tmp_path.iterdir()) == [opath]
+
+    # Directories replace directories, unless existing ones are kept
+    odir = tmp_path/'dir'
+    for name, exist_ok in [('a', False), ('b', False), ('c', True)]:
+        with atomic_path(odir, exist_ok=exist_ok) as tmp:
+            (tmp/name).mkdir(parents=True)
+    assert [p.name for p in odir.iterdir()] == ['b']
+    assert sorted(tmp_path.iterdir()) == [odir, opath]
+
+def test_atomic_path_threads(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+    opath = tmp_path/'out.txt'
+    def write(i):
+        with atomic_path(opath, exist_ok=True) as tmp:
+            tmp.write_text(str(i))
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(write, range(64)))
+    assert opath.read_text() in {str(i) for i in range(64)}
+    assert list(tmp_path.iterdir()) == [opath]
+
+def test_remove(tmp_path):
+    (tmp_path/'dir/sub').mkdir(parents=True)
+    (tmp_path/'dir/sub/file.txt').write_text('TEST\n')
+    (tmp_path/'link').symlink_to(tmp_path/'dir')
+    remove(tmp_path/'link')
+    assert (tmp_path/'dir/sub/file.txt').exists()
+    remove(tmp_path/'dir')
+    remove(tmp_path/'missing')
+    assert not any(tmp_path.iterdir())
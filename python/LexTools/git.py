@@ -1,46 +1,244 @@
 import subprocess
 from pathlib import Path
-from contextlib import contextmanager
+import functools
 import os
-from typing import Optional
-
-@contextmanager
-def changed_directory(path: Path):
-    if not path.is_dir():
-        path = path.parent
-    original_dir = Path.cwd()
-    os.chdir(path)
-    try:
-        yield
-    finally:
-        os.chdir(original_dir)
+from typing import NamedTuple, Optional
 
 def find_working_dir(path: Path) -> Optional[Path]:
-    while not (path/'.git').is_dir() and path != path.root:
-        path = path.parent
-    return path if path != path.root else None
+    for path in (path, *path.parents):
+        # .git is a file for worktrees and submodules
+        if (path/'.git').exists():
+            return path
+    return None
+
+@functools.lru_cache(maxsize=None)
+def default_working_dir() -> Path:
+    return find_working_dir(Path(__file__)) or Path.home()
 
-WORKING_DIR = find_working_dir(Path(__file__)) or Path.home()
+def __getattr__(name: str):
+    # Only search the file system for the working directory when needed
+    if name == 'WORKING_DIR':
+        return default_working_dir()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
-def get_status(path: Path = WORKING_DIR) -> str:
-    with changed_directory(path):
-        rv = subprocess.run(['git','status'], capture_output=True)
+def get_status(path: Optional[Path] = None) -> str:
+    rv = run_git(['status'], path)
     if rv.returncode != 0:
         return rv.stderr.decode('utf-8')
     return rv.stdout.decode('utf-8')
 
-def get_hash(path: Path = WORKING_DIR) -> str:
-    with changed_directory(path):
-        # git log -n1 --format="%H"
-        # git rev-parse HEAD
-        rv = subprocess.run(['git','rev-parse','HEAD'], capture_output=True)
+def get_hash(path: Optional[Path] = None) -> str:
+    try:
+        git_hash = read_head(path).hash
+    except (OSError, ValueError):
+        git_hash = None
+    if git_hash is not None:
+        return git_hash
+
+    # Fall back on git for errors and repository layouts not handled above
+    # git log -n1 --format="%H"
+    # git rev-parse HEAD
+    rv = run_git(['rev-parse','HEAD'], path)
     if rv.returncode != 0:
         return rv.stderr.decode('utf-8')
     return rv.stdout.decode('utf-8').strip()
 
-def get_diff(path: Path = WORKING_DIR) -> str:
-    with changed_directory(path):
-        rv = subprocess.run(['git','diff'], capture_output=True)
+def get_diff(path: Optional[Path] = None) -> str:
+    rv = run_git(['diff'], path)
     if rv.returncode != 0:
         return rv.stderr.decode('utf-8')
     return rv.stdout.decode('utf-8')
+
+def run_git(args: list[str], path: Optional[Path] = None, **kwargs):
+    '''Run git from path without changing the process working directory'''
+    kwargs.setdefault('capture_output', True)
+    return subprocess.run(['git', *args], cwd=_as_dir(path), **kwargs)
+
+def _as_dir(path: Optional[Path]) -> Path:
+    path = path or default_working_dir()
+    return path if path.is_dir() else path.parent
+
+################################################################################
+class RepoSnapshot(NamedTuple):
+    hash: Optional[str]     # None if there are no commits yet
+    branch: Optional[str]   # None if HEAD is detached
+    upstream: Optional[str] # None if no upstream branch is set
+    ahead: int              # Commits ahead of upstream
+    behind: int             # Commits behind upstream
+    dirty: dict[str, str]   # Changed tracked files -> status code (e.g. '.M')
+    untracked: list[str]
+
+def snapshot(
+    path: Optional[Path] = None,
+    diff_path: Optional[Path] = None,
+) -> RepoSnapshot:
+    '''Get the repository state with a single `git status` call
+
+    If diff_path is provided, `git diff HEAD` runs concurrently with its
+    output streamed directly into that file instead of being held in memory.
+    The diff includes both staged and unstaged changes to tracked files.
+    Raises subprocess.CalledProcessError if either git command fails.
+    '''
+    cwd = _as_dir(path)
+    status_cmd = [
+        # Avoid contending with the concurrent git diff for the index lock
+        'git', '--no-optional-locks', 'status', '--porcelain=v2', '--branch', '-z'
+    ]
+    status_proc = subprocess.Popen(
+        status_cmd, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    diff_proc = None
+    if diff_path is not None:
+        diff_cmd = ['git', 'diff', 'HEAD']
+        if _has_no_commits(cwd):
+            diff_cmd = ['git', 'diff', '--cached'] # Everything tracked is staged
+        with open(diff_path, 'wb') as ofile:
+            diff_proc = subprocess.Popen(
+                diff_cmd, cwd=cwd, stdout=ofile, stderr=subprocess.PIPE
+            )
+
+    status_out, status_err = status_proc.communicate()
+    if diff_proc is not None:
+        _, diff_err = diff_proc.communicate()
+        if diff_proc.returncode != 0:
+            raise subprocess.CalledProcessError(
+                diff_proc.returncode, diff_proc.args, stderr=diff_err
+            )
+    if status_proc.returncode != 0:
+        raise subprocess.CalledProcessError(
+            status_proc.returncode, status_cmd, status_out, status_err
+        )
+    return _parse_status(status_out)
+
+def _has_no_commits(path: Path) -> bool:
+    try:
+        return read_head(path).hash is None
+    except (OSError, ValueError):
+        return False
+
+def _parse_status(output: bytes) -> RepoSnapshot:
+    '''Parse output of `git status --porcelain=v2 --branch -z`'''
+    git_hash = branch = upstream = None
+    ahead = behind = 0
+    dirty = {}
+    untracked = []
+    entries = iter(output.decode('utf-8', 'surrogateescape').split('\0'))
+    for entry in entries:
+        if not entry:
+            continue
+        kind = entry[0]
+        if kind == '#':
+            key, _, value = entry[2:].partition(' ')
+            if key == 'branch.oid':
+                git_hash = None if value == '(initial)' else value
+            elif key == 'branch.head':
+                branch = None if value == '(detached)' else value
+            elif key == 'branch.upstream':
+                upstream = value
+            elif key == 'branch.ab':
+                n_ahead, n_behind = value.split()
+                ahead, behind = int(n_ahead), -int(n_behind)
+        elif kind == '1':
+            fields = entry.split(' ', 8)
+            dirty[fields[8]] = fields[1]
+        elif kind == '2':
+            fields = entry.split(' ', 9)
+            dirty[fields[9]] = fields[1]
+            next(entries) # Original path of renamed or copied file
+        elif kind == 'u':
+            fields = entry.split(' ', 10)
+            dirty[fields[10]] = fields[1]
+        elif kind == '?':
+            untracked.append(entry[2:])
+    return RepoSnapshot(git_hash, branch, upstream, ahead, behind, dirty, untracked)
+
+################################################################################
+# Reading repository metadata without running git
+class HeadInfo(NamedTuple):
+    hash: Optional[str]   # None if there are no commits yet
+    branch: Optional[str] # None if HEAD is detached
+
+# git directory -> (file modification times, HeadInfo)
+_HEAD_CACHE = {}
+
+def read_head(path: Optional[Path] = None) -> HeadInfo:
+    '''Read the checked out commit and branch directly from the .git directory
+
+    Results are cached until HEAD, the index, packed-refs or the branch ref
+    file are modified so repeated calls only cost a few stat() calls.
+    Raises FileNotFoundError if path is not in a git repository.
+    '''
+    git_dir, common_dir = find_git_dirs(path or default_working_dir())
+    cached = _HEAD_CACHE.get(git_dir)
+    branch = cached[1].branch if cached is not None else None
+    # Get modification times before reading to never cache outdated results
+    key = _head_stat_key(git_dir, common_dir, branch)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    head = _read_head(git_dir, common_dir)
+    if head.branch != branch:
+        key = _head_stat_key(git_dir, common_dir, head.branch)
+    _HEAD_CACHE[git_dir] = (key, head)
+    return head
+
+def find_git_dirs(path: Path) -> tuple[Path, Path]:
+    '''Find the git directory and the common directory holding shared refs
+
+    These are the same except for linked worktrees.
+    '''
+    working_dir = find_working_dir(path.resolve())
+    if working_dir is None:
+        raise FileNotFoundError(f'Not in a git repository: {path}')
+    git_dir = working_dir/'.git'
+    if git_dir.is_file():
+        # Worktrees and submodules contain 'gitdir: <path>'
+        content = git_dir.read_text().strip()
+        if not content.startswith('gitdir:'):
+            raise ValueError(f'Unexpected .git file content: {git_dir}')
+        git_dir = (working_dir/content[len('gitdir:'):].strip()).resolve()
+    common_dir = git_dir
+    if (git_dir/'commondir').is_file():
+        common_dir = (git_dir/(git_dir/'commondir').read_text().strip()).resolve()
+    return git_dir, common_dir
+
+def _head_stat_key(git_dir: Path, common_dir: Path, branch: Optional[str]) -> tuple:
+    paths = [git_dir/'HEAD', git_dir/'index', common_dir/'packed-refs']
+    if branch is not None:
+        paths.append(common_dir/'refs/heads'/branch)
+    key = []
+    for path in paths:
+        try:
+            key.append(os.stat(path).st_mtime_ns)
+        except FileNotFoundError:
+            key.append(None)
+    return tuple(key)
+
+def _read_head(git_dir: Path, common_dir: Path) -> HeadInfo:
+    head = (git_dir/'HEAD').read_text().strip()
+    if not head.startswith('ref:'):
+        return HeadInfo(hash=head, branch=None)
+    ref = head[len('ref:'):].strip()
+    branch = ref[len('refs/heads/'):] if ref.startswith('refs/heads/') else ref
+    return HeadInfo(hash=_resolve_ref(common_dir, ref), branch=branch)
+
+def _resolve_ref(git_dir: Path, ref: str) -> Optional[str]:
+    loose_ref = git_dir/ref
+    if loose_ref.is_file():
+        value = loose_ref.read_text().strip()
+        if value.startswith('ref:'):
+            return _resolve_ref(git_dir, value[len('ref:'):].strip())
+        return value
+    packed_refs = git_dir/'packed-refs'
+    if packed_refs.is_file():
+        with packed_refs.open('r') as ifile:
+            for line in ifile:
+                # Skip header and peeled tag lines
+                if line.startswith(('#', '^')):
+                    continue
+                git_hash, _, name = line.rstrip('\n').partition(' ')
+                if name == ref:
+                    return git_hash
+    if (git_dir/'reftable').is_dir():
+        raise ValueError(f'reftable format not supported: {git_dir}')
+    return None
@@ -1,14 +1,30 @@
 # Standard library
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
 from pathlib import Path
 from traceback import TracebackException
-from typing import Optional
+from typing import Iterable, Iterator, Optional, Union
+import atexit
+import collections
+import copy
+import gzip
+import json
 import logging
 import logging.config
-import re
+import logging.handlers
+import queue
+import os
+import shutil
+import subprocess
 import sys
+import threading
+import traceback
 
-# Local
-import git
+# 3rd party
+try:
+    import zstandard # Optional, for zstd compression of rotated logs
+except ImportError:
+    zstandard = None
 
 # Globals
 log = logging.getLogger(__name__)
@@ -28,8 +44,17 @@ def configure_logging(
     output_dir: Optional[Path] = None,
     fileConfig: Optional[Path] = None,
     dictConfig: Optional[dict] = None, 
+    background: bool = False,
+    rate_limit: Optional[dict] = None,
+    debug_buffer: Optional[int] = None,
+    capture_version_control: bool = False,
+    monitor_resources: Optional[dict] = None,
     **basicConfig,
 ) -> None:
+    if capture_version_control:
+        # Overlap the git calls with the rest of the setup
+        start_version_control_capture()
+
     # Update log files to be within output dir
     if output_dir is not None:
         if basicConfig.get('filename'):
@@ -46,7 +71,7 @@ def configure_logging(
         logging.config.fileConfig(fileConfig)
     
     if dictConfig is not None:
-        logging.config.dictConfig(**dictConfig)
+        logging.config.dictConfig(dictConfig)
     
     n_args = sum(map(bool, (fileConfig, dictConfig, basicConfig)))
     if n_args > 1:
@@ -56,6 +81,40 @@ def configure_logging(
             , n_args
         )
     
+    if rate_limit is not None:
+        rate_limiter = RateLimitFilter(**rate_limit)
+        for hndl in logging.root.handlers:
+            hndl.addFilter(rate_limiter)
+
+    if background:
+        log_in_background()
+
+    if debug_buffer:
+        # Keep the most recent records below the configured level in memory
+        # so they can be logged if the program crashes
+        for hndl in logging.root.handlers:
+            if hndl.level < logging.root.level:
+                hndl.setLevel(logging.root.level)
+        logging.root.setLevel(logging.DEBUG)
+        logging.root.addHandler(RingBufferHandler(debug_buffer))
+
+    if rate_limit is not None:
+        # Registered after log_in_background() so it runs first at exit
+        atexit.register(rate_limiter.flush)
+
+    if monitor_resources is not None:
+        # Imported here as psutil is only needed for monitoring
+        if __package__:
+            from . import resource_monitor
+        else:
+            import resource_monitor
+        # Samples are saved with the outputs unless filename is set to None
+        monitor_resources = dict(monitor_resources)
+        filename = monitor_resources.pop('filename', 'resource_usage.csv')
+        if filename is not None and output_dir is not None:
+            filename = output_dir/filename
+        resource_monitor.start(output_path=filename, **monitor_resources)
+
     redirect_exceptions_to_logger()
     # Use at your own risk. See function docstring for warnings
     #capture_python_stdout()
@@ -131,28 +190,74 @@ def log_multiline(log_call, txt):
 def summarize_logging() -> str:
     return logging_hierarchy_str() + '\n' + log_summary_str(logging.root)
 
+_VERSION_CONTROL_CAPTURE = None
+
+def start_version_control_capture(diff_path: Optional[Path] = None) -> Future:
+    '''Start capturing the version control state in a background thread
+
+    summarize_version_control() uses the result if a capture was started.
+    The thread is a daemon so short programs do not wait on it at exit. Only
+    the first call starts a capture so call this with diff_path before
+    configure_logging() if the diff should be saved.
+
+    Parameters
+    ==========
+    diff_path:
+        Save the diff of uncommitted changes to this file
+    '''
+    global _VERSION_CONTROL_CAPTURE
+    if _VERSION_CONTROL_CAPTURE is None:
+        future = Future()
+        def capture():
+            try:
+                future.set_result(_capture_version_control(diff_path))
+            except Exception as err:
+                future.set_exception(err)
+        threading.Thread(
+            target=capture, name='version_control_capture', daemon=True
+        ).start()
+        _VERSION_CONTROL_CAPTURE = future
+    return _VERSION_CONTROL_CAPTURE
+
+def _capture_version_control(diff_path: Optional[Path] = None):
+    # Imported here as finding the repository is not needed for logging
+    if __package__:
+        from . import git
+    else:
+        import git
+    return git.snapshot(diff_path=diff_path)
+
 def summarize_version_control() -> str:
     # TODO: Handle multiple version control systems
     # import version_control
     # if version_control.SYSTEM is not version_control.VCS.GIT:
     #     raise NotImplementedError
+    global _VERSION_CONTROL_CAPTURE
 
     ########################################
     # Git summary
-    git_hash = git.get_hash()
-    git_status = git.get_status()
-    # Remove hints on how to use git from status
-    lines = []
-    for line in git_status.splitlines():
-        line = re.sub(r'\(use "git.*\)','', line)
-        if line.strip():
-            lines.append(line.replace('\t',' '*4))
-    git_status = '\n'.join(lines)
-    summary = (
-        f"Git Hash: {git_hash}"
-        "\n"
-        f"Git Status:\n{git_status}"
-    )
+    try:
+        if _VERSION_CONTROL_CAPTURE is not None:
+            capture, _VERSION_CONTROL_CAPTURE = _VERSION_CONTROL_CAPTURE, None
+            snap = capture.result()
+        else:
+            snap = _capture_version_control()
+    except subprocess.CalledProcessError as err:
+        return f'Git Status: {err.stderr.decode("utf-8").strip()}'
+    except OSError as err:
+        return f'Git Status: {err}'
+
+    branch = snap.branch or '(detached HEAD)'
+    if snap.upstream is not None:
+        branch += f' [{snap.upstream}: ahead {snap.ahead}, behind {snap.behind}]'
+    lines = [
+        f'Git Hash: {snap.hash}',
+        f'Git Branch: {branch}',
+        f'Git Status: {len(snap.dirty)} changed, {len(snap.untracked)} untracked',
+    ]
+    lines += [f'    {code} {path}' for path, code in snap.dirty.items()]
+    lines += [f'    ?? {path}' for path in snap.untracked]
+    summary = '\n'.join(lines)
 
     ########################################
     return summary
@@ -164,6 +269,293 @@ class RecordAttributeAdder(logging.Filter):
         record.name_last = record.name.rsplit('.', 1)[-1]
         return True
 
+class RateLimitFilter(logging.Filter):
+    '''Rate-limit records sharing the same logger and message template
+
+    At most `rate` records per (logger name, unformatted message) are let
+    through every `period` seconds. The first record let through after others
+    were dropped is annotated with how many similar messages were suppressed.
+    The per-record cost is a dict lookup as the record creation time is used
+    instead of querying the clock. Attach the same instance to every handler
+    of a logger so all handlers see the same records.
+
+    Parameters
+    ==========
+    rate:
+        Records allowed per (logger, template) each period
+    period:
+        Length of the rate-limiting window (sec)
+    max_keys:
+        Maximum number of (logger, template) pairs tracked. All tracking is
+        reset when exceeded to bound memory usage.
+    '''
+    def __init__(self, rate: int = 10, period: float = 60, max_keys: int = 10_000):
+        super().__init__()
+        self.rate = rate
+        self.period = period
+        self.max_keys = max_keys
+        # (name, msg) -> [window start, records seen in window, level]
+        self._windows = {}
+        # Handlers may filter in the caller threads and the queue listener
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # The same record is passed to this filter once per handler
+        with self._lock:
+            passed = record.__dict__.get('rate_limit_passed')
+            if passed is None:
+                passed = record.rate_limit_passed = self._filter(record)
+        return passed
+
+    def _filter(self, record: logging.LogRecord) -> bool:
+        key = (record.name, record.msg)
+        try:
+            window = self._windows.get(key)
+        except TypeError: # unhashable message object
+            return True
+
+        if window is None:
+            if len(self._windows) >= self.max_keys:
+                self._windows.clear()
+            self._windows[key] = [record.created, 1, record.levelno]
+            return True
+        if record.created - window[0] < self.period:
+            window[1] += 1
+            return window[1] <= self.rate
+
+        # New window
+        n_suppressed = window[1] - self.rate
+        window[0] = record.created
+        window[1] = 1
+        if n_suppressed > 0:
+            record.args = (record.getMessage(), n_suppressed)
+            record.msg = '%s [suppressed %d similar messages]'
+        return True
+
+    def flush(self) -> None:
+        '''Log the number of suppressed messages in all current windows'''
+        with self._lock:
+            windows, self._windows = self._windows, {}
+        # Logged without the lock as the records pass through filter()
+        for (name, msg), (_, n_seen, level) in windows.items():
+            n_suppressed = n_seen - self.rate
+            if n_suppressed > 0:
+                logging.getLogger(name).log(
+                    level, 'Suppressed %d similar messages: %s', n_suppressed, msg
+                )
+
+class RingBufferHandler(logging.Handler):
+    '''Keep the most recent log records in memory
+
+    Records are stored unformatted so handling a record costs little more
+    than a deque append. Call dump() to pass the buffered records on to other
+    handlers (e.g. after an uncaught exception). Note the logger level must
+    be low enough for records to be created in the first place (see
+    configure_logging(debug_buffer=...)).
+
+    Parameters
+    ==========
+    capacity:
+        Number of records to keep
+    level:
+        Minimum level of records to keep
+    '''
+    def __init__(self, capacity: int = 1000, level: int = logging.DEBUG):
+        super().__init__(level)
+        self.buffer = collections.deque(maxlen=capacity)
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        # deque.append is thread-safe so the handler lock is not needed
+        passed = self.filter(record)
+        if passed:
+            self.buffer.append(record)
+        return passed
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.buffer.append(record)
+
+    def take(self) -> list[logging.LogRecord]:
+        '''Remove and return the buffered records, oldest first'''
+        records = list(self.buffer)
+        self.buffer.clear()
+        return records
+
+    def dump(
+        self,
+        handlers: Iterable[logging.Handler],
+        records: Optional[list[logging.LogRecord]] = None,
+    ) -> None:
+        '''Send buffered records to handlers, skipping those already handled
+
+        Records at or above a handler's level were already passed to that
+        handler when they were logged so only records below it are sent.
+        The buffer is cleared unless records from take() are given instead.
+        '''
+        if records is None:
+            records = self.take()
+        for hndl in handlers:
+            for record in records:
+                if record.levelno < hndl.level:
+                    hndl.handle(record)
+
+################################################################################
+# Structured logging
+class JSONFormatter(logging.Formatter):
+    '''Format log records as compact, single-line JSON objects (JSON lines)
+
+    Keys: time (epoch seconds), level, name, name_last, message and, only when
+    present, args, exc and stack. Arguments that are not JSON serializable are
+    written with repr().
+
+    Example dictConfig formatter:
+    ```
+    formatters:
+        json:
+            (): logging_utils.JSONFormatter
+    ```
+    '''
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._encode = json.JSONEncoder(
+            separators   = (',', ':'),
+            ensure_ascii = False,
+            default      = repr,
+        ).encode
+
+    def format(self, record: logging.LogRecord) -> str:
+        obj = {
+            'time'      : record.created,
+            'level'     : record.levelname,
+            'name'      : record.name,
+            'name_last' : record.name.rsplit('.', 1)[-1],
+            'message'   : record.getMessage(),
+        }
+        if record.args:
+            obj['args'] = record.args
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            obj['exc'] = record.exc_text
+        if record.stack_info:
+            obj['stack'] = self.formatStack(record.stack_info)
+        return self._encode(obj)
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    '''QueueHandler that leaves message formatting to the QueueListener
+
+    The standard QueueHandler merges args into the message in the logging
+    thread so records can be pickled. This handler only renders tracebacks,
+    deferring `%` formatting (and JSON encoding) to the handlers running in
+    the listener thread. Therefore, only use it with in-process queues and do
+    not mutate objects passed as log arguments after logging them.
+    '''
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info:
+            # Avoid keeping frames alive while the record waits in the queue
+            record = copy.copy(record)
+            record.exc_text = _EXC_FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+_EXC_FORMATTER = logging.Formatter()
+
+def log_in_background(
+    logger: logging.Logger = logging.root,
+) -> logging.handlers.QueueListener:
+    '''Move all handlers of a logger onto a background thread
+
+    The logger is given a single LazyQueueHandler so the calling thread only
+    pays for creating the log record. The listener is stopped, flushing all
+    queued records, at interpreter exit.
+    '''
+    handlers = logger.handlers[:]
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(
+        log_queue, *handlers, respect_handler_level=True
+    )
+    for hndl in handlers:
+        logger.removeHandler(hndl)
+    logger.addHandler(LazyQueueHandler(log_queue))
+    listener.start()
+    atexit.register(_stop_listener, listener)
+    return listener
+
+def _stop_listener(listener: logging.handlers.QueueListener) -> None:
+    # QueueListener.stop() fails if the listener was already stopped
+    if listener._thread is not None:
+        listener.stop()
+
+def read_json_log(
+    path: Path,
+    level: Union[int, str, None] = None,
+    start: Union[float, datetime, None] = None,
+    end: Union[float, datetime, None] = None,
+    name: Optional[str] = None,
+) -> Iterator[dict]:
+    '''Stream records from a log file written with JSONFormatter
+
+    Lines are read one at a time so arbitrarily large logs can be filtered.
+    Lines that are not valid JSON (e.g. a line truncated by a crash) are
+    skipped. Compressed logs (e.g. rotated by CompressingRotatingFileHandler)
+    are decompressed on the fly.
+
+    Parameters
+    ==========
+    path:
+        JSON lines log file
+    level:
+        Minimum level (e.g. 'WARNING' or logging.WARNING)
+    start, end:
+        Only yield records logged within [start, end)
+    name:
+        Only yield records from this logger or its children
+    '''
+    if isinstance(level, str):
+        level = logging.getLevelName(level.upper())
+    if isinstance(start, datetime):
+        start = start.timestamp()
+    if isinstance(end, datetime):
+        end = end.timestamp()
+    name_prefix = None if name in (None, 'root') else name + '.'
+
+    with open_log(path) as ifile:
+        for line in ifile:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if level is not None and _level_number(record['level']) < level:
+                continue
+            if start is not None and record['time'] < start:
+                continue
+            if end is not None and record['time'] >= end:
+                continue
+            if (
+                name_prefix is not None
+                and record['name'] != name
+                and not record['name'].startswith(name_prefix)
+            ):
+                continue
+            yield record
+
+def open_log(path: Path, mode: str = 'rt'):
+    '''Open a log file, decompressing based on the file suffix'''
+    path = str(path)
+    if path.endswith('.gz'):
+        return gzip.open(path, mode)
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise ImportError(f'zstandard package required to open {path}')
+        return zstandard.open(path, mode)
+    return open(path, mode)
+
+def _level_number(name: str) -> int:
+    level = logging.getLevelName(name)
+    if isinstance(level, int):
+        return level
+    # Unregistered levels are named 'Level N'
+    return int(name.rsplit(' ', 1)[-1]) if name.startswith('Level ') else 0
+
 def redirect_exceptions_to_logger(logger: logging.Logger = logging.root):
     # Overwrite hook for processing exceptions
     # https://stackoverflow.com/questions/6234405/logging-uncaught-exceptions-in-python
@@ -175,6 +567,14 @@ def redirect_exceptions_to_logger(logger: logging.Logger = logging.root):
             return
         nonlocal logger
 
+        # Add context from records that were not logged
+        for hndl in logger.handlers:
+            if isinstance(hndl, RingBufferHandler):
+                # Taken first so the header does not push out the oldest record
+                records = hndl.take()
+                logger.error('Buffered log records preceding uncaught exception:')
+                hndl.dump((h for h in logger.handlers if h is not hndl), records)
+
         # Option 1 - trace in one log error message
         #logger.exception("Uncaught exception", exc_info=(typ, val, tb))
 
@@ -249,3 +649,263 @@ def capture_unix_fd():
     os.spawnve("P_WAIT", "/bin/ls", ["/bin/ls"], {})
     os.execve("/bin/ls", ["/bin/ls"], os.environ)
 
+
+################################################################################
+# Log rotation
+COMPRESSION_SUFFIXES = {'gzip' : '.gz', 'zstd' : '.zst'}
+
+class _BackgroundCompressionMixin:
+    '''Compress rotated log files in a background thread
+
+    The logging thread only renames the rotated file. Compression happens in
+    a single worker thread and the next rollover waits for the previous
+    compression to finish, which only blocks if logs rotate faster than they
+    can be compressed. Closing the handler waits for pending compression.
+    '''
+    def _setup_compression(self, compression: str) -> None:
+        if compression not in COMPRESSION_SUFFIXES:
+            raise ValueError(
+                f'Unexpected compression {compression!r}. '
+                f'Choose from {tuple(COMPRESSION_SUFFIXES)}'
+            )
+        if compression == 'zstd' and zstandard is None:
+            raise ImportError('zstandard package required for zstd compression')
+        self.suffix_compressed = COMPRESSION_SUFFIXES[compression]
+        self.namer = self._compressed_name
+        self.rotator = self._rename_and_compress
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='log_compression'
+        )
+        self._pending = None
+
+    def doRollover(self):
+        self.wait_for_compression()
+        super().doRollover()
+
+    def close(self):
+        super().close()
+        self.wait_for_compression()
+        self._executor.shutdown()
+
+    def wait_for_compression(self) -> None:
+        if self._pending is not None:
+            self._pending.result()
+            self._pending = None
+
+    def _compressed_name(self, name: str) -> str:
+        return name + self.suffix_compressed
+
+    def _rename_and_compress(self, source: str, dest: str) -> None:
+        uncompressed = dest[:-len(self.suffix_compressed)]
+        os.rename(source, uncompressed)
+        self._pending = self._executor.submit(_compress_file, uncompressed, dest)
+
+def _compress_file(source: str, dest: str) -> None:
+    try:
+        with open(source, 'rb') as ifile, open_log(dest, 'wb') as ofile:
+            shutil.copyfileobj(ifile, ofile, 1024*1024)
+        os.remove(source)
+    except Exception:
+        # Similar to logging.Handler.handleError, which requires a record
+        traceback.print_exc(file=sys.stderr)
+
+class CompressingRotatingFileHandler(
+    _BackgroundCompressionMixin, logging.handlers.RotatingFileHandler
+):
+    '''RotatingFileHandler that compresses rotated files in the background
+
+    Accepts all RotatingFileHandler arguments (e.g. maxBytes, backupCount)
+    plus `compression` ('gzip' or 'zstd'). Example dictConfig handler:
+    ```
+    handlers:
+        file:
+            class: logging_utils.CompressingRotatingFileHandler
+            filename: run.log
+            maxBytes: 100000000
+            backupCount: 10
+            compression: gzip
+    ```
+    '''
+    def __init__(self, *args, compression: str = 'gzip', **kwargs):
+        super().__init__(*args, **kwargs)
+        self._setup_compression(compression)
+
+class CompressingTimedRotatingFileHandler(
+    _BackgroundCompressionMixin, logging.handlers.TimedRotatingFileHandler
+):
+    '''TimedRotatingFileHandler that compresses rotated files in the background
+
+    Accepts all TimedRotatingFileHandler arguments (e.g. when, interval,
+    backupCount) plus `compression` ('gzip' or 'zstd').
+    '''
+    def __init__(self, *args, compression: str = 'gzip', **kwargs):
+        super().__init__(*args, **kwargs)
+        self._setup_compression(compression)
+
+################################################################################
+# PyTests to be moved into tests/ if added to project
+def test_json_logging(tmp_path):
+    opath = tmp_path/'run.jsonl'
+    logger = logging.getLogger('test_json_logging.child')
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    hndl = logging.FileHandler(opath)
+    hndl.setFormatter(JSONFormatter())
+    logger.addHandler(hndl)
+    listener = log_in_background(logger)
+
+    logger.debug('Debug %d', 1)
+    logger.warning('Warning %s', Path('a'))
+    try:
+        1/0
+    except ZeroDivisionError:
+        logger.exception('Error')
+    listener.stop()
+    hndl.close()
+
+    records = list(read_json_log(opath))
+    assert [r['message'] for r in records] == ['Debug 1', 'Warning a', 'Error']
+    assert records[0]['args'] == [1]
+    assert records[1]['args'] == [repr(Path('a'))]
+    assert records[0]['name_last'] == 'child'
+    assert 'ZeroDivisionError' in records[2]['exc']
+
+    assert len(list(read_json_log(opath, level='WARNING'))) == 2
+    assert len(list(read_json_log(opath, name='test_json_logging'))) == 3
+    assert len(list(read_json_log(opath, name='test_json'))) == 0
+    assert len(list(read_json_log(opath, end=records[0]['time']))) == 0
+
+def test_rate_limit_filter():
+    logger = logging.getLogger('test_rate_limit_filter')
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    records1, records2 = [], []
+    rate_limiter = RateLimitFilter(rate=2, period=60)
+    for records in (records1, records2):
+        hndl = logging.Handler()
+        hndl.emit = records.append
+        hndl.addFilter(rate_limiter)
+        logger.addHandler(hndl)
+
+    for i in range(5):
+        logger.info('Event %d', i)
+    logger.info('Other event')
+    assert [r.getMessage() for r in records1] == ['Event 0', 'Event 1', 'Other event']
+    assert records1 == records2
+
+    # Start of a new window reports suppressed messages
+    rate_limiter.period = 0
+    logger.info('Event %d', 5)
+    assert records1[-1].getMessage() == 'Event 5 [suppressed 3 similar messages]'
+
+    logger.info('Event %d', 6)
+    logger.info('Event %d', 7)
+    rate_limiter.period = 60
+    logger.info('Event %d', 8)
+    logger.info('Event %d', 9)
+    rate_limiter.flush()
+    assert records1[-1].getMessage() == 'Suppressed 1 similar messages: Event %d'
+
+    # Limit is exact when logging from many threads
+    del records1[:], records2[:]
+    def log_events():
+        for i in range(1000):
+            logger.info('Threaded event %d', i)
+    threads = [threading.Thread(target=log_events) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(records1) == len(records2) == 2
+    rate_limiter.flush()
+    assert records1[-1].getMessage() == 'Suppressed 7998 similar messages: Threaded event %d'
+
+def test_ring_buffer_handler():
+    logger = logging.getLogger('test_ring_buffer_handler')
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    records = []
+    hndl = logging.Handler(logging.INFO)
+    hndl.emit = records.append
+    logger.addHandler(hndl)
+    logger.addHandler(RingBufferHandler(capacity=3))
+
+    logger.debug('Debug 1')
+    logger.debug('Debug 2')
+    logger.info('Info 1')
+    logger.debug('Debug 3')
+    logger.debug('Debug 4')
+    assert [r.getMessage() for r in records] == ['Info 1']
+
+    # Buffered records not yet handled are dumped on uncaught exceptions
+    redirect_exceptions_to_logger(logger)
+    try:
+        try:
+            raise ValueError('Crash')
+        except ValueError:
+            sys.excepthook(*sys.exc_info())
+    finally:
+        sys.excepthook = sys.__excepthook__
+    messages = [r.getMessage() for r in records]
+    # All capacity records are dumped, skipping the already handled 'Info 1'
+    assert messages[1:4] == [
+        'Buffered log records preceding uncaught exception:',
+        'Debug 3',
+        'Debug 4',
+    ]
+    assert messages[4] == 'Uncaught exception'
+
+def test_compressing_rotating_file_handler(tmp_path):
+    opath = tmp_path/'run.log'
+    logger = logging.getLogger('test_compressing_rotating_file_handler')
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    hndl = CompressingRotatingFileHandler(opath, maxBytes=200, backupCount=2)
+    hndl.setFormatter(JSONFormatter())
+    logger.addHandler(hndl)
+
+    for i in range(10):
+        logger.info('Message %d', i)
+    hndl.close()
+    logger.removeHandler(hndl)
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        'run.log', 'run.log.1.gz', 'run.log.2.gz'
+    ]
+    messages = [
+        r['message']
+        for path in ('run.log.2.gz', 'run.log.1.gz', 'run.log')
+        for r in read_json_log(tmp_path/path)
+    ]
+    assert messages == [f'Message {i}' for i in range(10-len(messages), 10)]
+
+def test_summarize_version_control(monkeypatch):
+    # Capturing in a background thread must not change the process working
+    # directory that other threads resolve relative paths against
+    def chdir(path):
+        raise AssertionError(f'Working directory changed to {path}')
+    monkeypatch.setattr(os, 'chdir', chdir)
+
+    summary = summarize_version_control()
+    assert summary.startswith('Git Hash: ')
+    start_version_control_capture()
+    assert summarize_version_control() == summary
+
+def test_configure_logging_monitor_resources(tmp_path, monkeypatch):
+    import pytest
+    pytest.importorskip('psutil')
+    if __package__:
+        from . import resource_monitor
+    else:
+        import resource_monitor
+    output_paths = []
+    monkeypatch.setattr(
+        resource_monitor, 'start', lambda output_path, **kw: output_paths.append(output_path)
+    )
+    monkeypatch.setattr(sys, 'excepthook', sys.excepthook)
+
+    # Samples are saved with the outputs by default
+    configure_logging(output_dir=tmp_path, monitor_resources={'interval' : 1})
+    configure_logging(output_dir=tmp_path, monitor_resources={'filename' : 'usage.npz'})
+    configure_logging(monitor_resources={'filename' : None})
+    assert output_paths == [tmp_path/'resource_usage.csv', tmp_path/'usage.npz', None]
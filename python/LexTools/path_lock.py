@@ -10,8 +10,11 @@ import os
 import typing as T
 import pprint
 
-# 3rd party
-import yaml
+# Local
+if __package__:
+    from . import yaml_utils
+else:
+    import yaml_utils
 
 # Globals
 log = logging.getLogger(__name__)
@@ -55,7 +58,7 @@ def path_lock(
     lock_info = None
     if not lock_aquired:
         with lock.open('r') as ifile:
-            lock_info = yaml.safe_load(ifile)
+            lock_info = yaml_utils.safe_load(ifile)
         start = time.perf_counter()
         sleep_time = min(1, timeout/4)
         lock_info_str = pprint.pformat(lock_info, indent=4, sort_dicts=False)
@@ -74,7 +77,7 @@ def path_lock(
         lock_info = create_lock_info(lock, path, max_lock_time)
         # log.debug('Creating lock: %s', lock)
         with lock.open('w') as ofile:
-            yaml.safe_dump(lock_info, ofile)
+            yaml_utils.safe_dump(lock_info, ofile)
     try:
         yield lock_info if lock_aquired else None
     finally:
@@ -111,8 +114,6 @@ def lock_in_use(lock_info: dict) -> bool:
 
 ################################################################################
 # PyTests to be moved into tests/ if added to project
-import multiprocessing
-
 def test_path_lock():
     opath = Path('test_output_dir')
     with path_lock(opath, max_lock_time=0.1) as aquired_lock:
@@ -123,6 +124,7 @@ def test_path_lock():
             assert aquired_lock_again is not None
 
 def test_path_lock_timeout():
+    import multiprocessing
     n_procs = multiprocessing.cpu_count()
     timeouts = [2] * n_procs
     with multiprocessing.Pool(processes=n_procs) as pool:
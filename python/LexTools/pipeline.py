@@ -0,0 +1,131 @@
+'''
+Bounded producer/consumer pipelines overlapping I/O with computation
+
+How to use:
+```
+images = prefetch(read_image, paths, workers=4, depth=16)
+for path, img in zip(paths, images):
+    ... # Process img while the next images are read in the background
+```
+'''
+# Standard library
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import queue
+import threading
+from typing import Callable, Iterable, Iterator
+
+# Local
+if __package__:
+    from . import scripting
+else:
+    import scripting
+
+# Globals
+log = logging.getLogger(__name__)
+_DONE = object() # Marks the end of the items
+
+################################################################################
+def prefetch(
+    func: Callable,
+    items: Iterable,
+    workers: int = 4,
+    depth: int = 8,
+) -> Iterator:
+    '''Apply func to items in background threads, yielding results in order
+
+    A producer thread iterates over items (e.g. a lazy directory listing) and
+    submits them to a thread pool, blocking once depth results are pending so
+    memory use does not grow with the number of items. Exceptions are
+    re-raised in the consumer as scripting.TaskError naming the failed item.
+
+    Parameters
+    ==========
+    func:
+        Function of one item, usually I/O-bound (e.g. reading and decoding)
+    items:
+        Inputs to func, consumed lazily
+    workers:
+        Number of threads running func
+    depth:
+        Maximum number of results read ahead of the consumer
+    '''
+    pending = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    pool = ThreadPoolExecutor(workers, thread_name_prefix='prefetch')
+
+    def produce():
+        try:
+            for item in items:
+                future = pool.submit(func, item)
+                if not _put(pending, (item, future), stop):
+                    future.cancel()
+                    return
+        except Exception as err:
+            _put(pending, (_DONE, err), stop)
+        else:
+            _put(pending, (_DONE, None), stop)
+    producer = threading.Thread(target=produce, name='prefetch_producer', daemon=True)
+    producer.start()
+
+    try:
+        while True:
+            item, future = pending.get()
+            if item is _DONE:
+                if future is not None:
+                    raise future # Iterating over items failed
+                return
+            try:
+                result = future.result()
+            except Exception as err:
+                raise scripting.TaskError(
+                    f'Failed on {item!r}: {type(err).__name__}: {err}'
+                ) from err
+            yield result
+    finally:
+        # Unblock and stop the producer if the consumer stopped early
+        stop.set()
+        while producer.is_alive():
+            try:
+                pending.get(timeout=0.1)[1].cancel()
+            except (queue.Empty, AttributeError):
+                pass
+        pool.shutdown(cancel_futures=True)
+
+def _put(pending: queue.Queue, entry: tuple, stop: threading.Event) -> bool:
+    '''Put entry in the queue unless stopped, returning False if stopped'''
+    while not stop.is_set():
+        try:
+            pending.put(entry, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+################################################################################
+# PyTests to be moved into tests/ if added to project
+def test_prefetch():
+    import pytest
+    assert list(prefetch(int, map(str, range(100)), workers=3, depth=2)) == list(range(100))
+    assert list(prefetch(int, [])) == []
+
+    # Read-ahead is bounded
+    submitted = []
+    def items():
+        for i in range(100):
+            submitted.append(i)
+            yield i
+    results = prefetch(str, items(), workers=2, depth=4)
+    assert next(results) == '0'
+    threading.Event().wait(0.2)
+    assert len(submitted) <= 4 + 2
+    results.close()
+
+    with pytest.raises(scripting.TaskError, match="'x': ValueError"):
+        list(prefetch(int, ['1', 'x', '3']))
+
+    def failing_items():
+        yield '1'
+        raise OSError('listing failed')
+    with pytest.raises(OSError, match='listing failed'):
+        list(prefetch(int, failing_items()))
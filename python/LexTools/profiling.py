@@ -0,0 +1,127 @@
+'''
+Profiling of script runs, enabled by configuration instead of code changes
+
+How to use:
+```
+profiler = Profiler(output_dir, cprofile=True, sample_interval=1)
+profiler.start()
+... # Run, timing stages with stopwatch.stopwatch
+profiler.stop() # Or left to run at exit
+```
+'''
+# Standard library
+import atexit
+import cProfile
+import io
+import json
+import logging
+from pathlib import Path
+import pstats
+from typing import Optional
+
+# Local
+if __package__:
+    from .stopwatch import stopwatch as global_stopwatch
+else:
+    from stopwatch import stopwatch as global_stopwatch
+
+# Globals
+log = logging.getLogger(__name__)
+
+################################################################################
+class Profiler:
+    '''Profilers of a run, saving their results in output_dir
+
+    Parameters
+    ==========
+    output_dir:
+        Directory for saving results
+    cprofile:
+        Profile the calling thread with cProfile, saving profile.prof (e.g.
+        for snakeviz) and profile_summary.txt listing the top_n functions by
+        cumulative time. Other threads and processes are not profiled.
+    top_n:
+        Number of functions in profile_summary.txt
+    stopwatch:
+        Log the summary of the global stopwatch.Stopwatch and save its
+        timers to timings.json
+    sample_interval:
+        Seconds between samples of the CPU, memory and I/O use of the process
+        tree saved to resource_usage.csv (see resource_monitor)
+    '''
+    def __init__(
+        self,
+        output_dir: Path,
+        cprofile: bool = False,
+        top_n: int = 30,
+        stopwatch: bool = True,
+        sample_interval: Optional[float] = None,
+    ):
+        self.output_dir = Path(output_dir)
+        self.top_n = top_n
+        self.stopwatch = stopwatch
+        self.sample_interval = sample_interval
+        self._profile = cProfile.Profile() if cprofile else None
+        self._monitor = None
+        self._started = False
+
+    def start(self) -> None:
+        '''Start profiling, stopping automatically at exit if not stopped'''
+        if self._started:
+            return
+        self._started = True
+        if self.sample_interval is not None:
+            # Imported here as psutil is only needed for sampling
+            if __package__:
+                from . import resource_monitor
+            else:
+                import resource_monitor
+            self._monitor = resource_monitor.start(
+                output_path = self.output_dir/'resource_usage.csv',
+                interval = self.sample_interval,
+            )
+        if self._profile is not None:
+            self._profile.enable()
+        atexit.register(self.stop)
+
+    def stop(self) -> None:
+        '''Stop profiling and save results'''
+        if not self._started:
+            return
+        self._started = False
+        atexit.unregister(self.stop)
+
+        if self._profile is not None:
+            self._profile.disable()
+            opath = self.output_dir/'profile.prof'
+            self._profile.dump_stats(opath)
+            summary = io.StringIO()
+            stats = pstats.Stats(self._profile, stream=summary)
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top_n)
+            (self.output_dir/'profile_summary.txt').write_text(summary.getvalue())
+            log.info('Profile saved: %s', opath)
+
+        if self._monitor is not None:
+            self._monitor.stop()
+
+        if self.stopwatch:
+            opath = self.output_dir/'timings.json'
+            opath.write_text(json.dumps(global_stopwatch.to_dict(), indent=4))
+            log.info('Stopwatch summary:\n%s', global_stopwatch.summary())
+            log.info('Timings saved: %s', opath)
+
+################################################################################
+# PyTests to be moved into tests/ if added to project
+def test_profiler(tmp_path):
+    global_stopwatch.clear()
+    profiler = Profiler(tmp_path, cprofile=True, top_n=5)
+    profiler.start()
+    global_stopwatch.start('work')
+    sorted(range(100_000), key=lambda x: -x)
+    global_stopwatch.stop('work')
+    profiler.stop()
+    profiler.stop()
+
+    assert pstats.Stats(str(tmp_path/'profile.prof')).total_calls > 0
+    assert 'cumulative' in (tmp_path/'profile_summary.txt').read_text()
+    assert set(json.loads((tmp_path/'timings.json').read_text())) == {'TOTAL', 'work'}
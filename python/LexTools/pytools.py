@@ -0,0 +1,164 @@
+'''
+Digit manipulation of integers, including huge ones
+
+Converting between an int and its decimal digits with str() and int() takes
+quadratic time in the number of digits and is refused above
+sys.get_int_max_str_digits() (4300 by default). These utilities instead
+convert huge values by divide and conquer:
+- int -> digits splits the value on bits (cheap shifts) and recombines the
+  halves with decimal arithmetic, whose multiplication is subquadratic
+- digits -> int splits the digits and recombines the halves as
+  hi * 10**len(lo) + lo using cached powers of ten
+Small values and the leaves of the recursion use str() and int() directly.
+
+How to use:
+```
+ndigits(10**10000 - 1)       # 10000
+split_int(-1234)             # [1, 2, 3, 4]
+join_ints([1, 2, 3, 4])      # 1234
+pop_digit(1234)              # (123, 4)
+get_nth_digit(1234, 0)       # 1
+```
+'''
+# Standard library
+import decimal
+import functools
+import math
+from typing import Optional
+
+# Globals
+_LOG10_2 = math.log10(2)
+# Leaves of the recursions stay below the smallest allowed int/str limit (640)
+_LEAF_BITS = 2048 # 617 digits
+_LEAF_DIGITS = 600
+# Decimal context for exact arithmetic on arbitrarily large integers
+_EXACT = decimal.Context(
+    prec = decimal.MAX_PREC,
+    Emax = decimal.MAX_EMAX,
+    Emin = decimal.MIN_EMIN,
+    traps = [decimal.Inexact, decimal.InvalidOperation, decimal.Overflow],
+)
+_DIGITS_TO_VALUES = bytes.maketrans(b'0123456789', bytes(range(10)))
+_VALUES_TO_DIGITS = bytes.maketrans(bytes(range(10)), b'0123456789')
+
+################################################################################
+def ndigits(n: int) -> int:
+    '''Number of decimal digits of n, ignoring the sign'''
+    _check_int(n)
+    n = abs(n)
+    if n.bit_length() <= _LEAF_BITS:
+        return len(str(n))
+    # Exact or one too few digits, or one too many if the float rounded up
+    k = int((n.bit_length() - 1) * _LOG10_2) + 1
+    lower = _pow10(k - 1)
+    if n < lower:
+        return k - 1
+    return k + 1 if n >= 10 * lower else k
+
+def pop_digit(n: int, from_left: bool = False) -> tuple[Optional[int], int]:
+    '''Remove the last (or first) digit of n
+
+    Returns
+    =======
+    The remaining integer, keeping the sign of n, or None if n has a single
+    digit, and the removed digit
+    '''
+    _check_int(n)
+    sign = -1 if n < 0 else 1
+    n = abs(n)
+    if n < 10:
+        return None, n
+    if from_left:
+        lower = _pow10(ndigits(n) - 1)
+        digit = n // lower # Single digit quotient so linear time
+        return sign * (n - digit * lower), digit
+    rest, digit = divmod(n, 10)
+    return sign * rest, digit
+
+def split_int(n: int) -> list[int]:
+    '''Decimal digits of n, ignoring the sign'''
+    _check_int(n)
+    return list(_digit_string(abs(n)).encode().translate(_DIGITS_TO_VALUES))
+
+def join_ints(ints: list[int]) -> int:
+    '''Concatenate the decimal digits of non-negative integers
+
+    e.g. join_ints([1, 2, 3]) == 123 and join_ints([12, 0, 345]) == 120345
+    '''
+    ints = list(ints)
+    if not ints:
+        raise IndexError('join_ints() requires at least one integer')
+    try:
+        values = bytes(ints)
+    except (TypeError, ValueError):
+        values = None
+    if values is not None and max(values) < 10:
+        # All single digits
+        digits = values.translate(_VALUES_TO_DIGITS).decode()
+    else:
+        for x in ints:
+            if not isinstance(x, int) or x < 0:
+                raise TypeError(f'Expected non-negative integers, got {x!r}')
+        digits = ''.join(_digit_string(x) for x in ints)
+    return _int_from_digits(digits)
+
+def get_nth_digit(n: int, index: int, from_right: bool = False) -> int:
+    '''Digit of n at index, counting from 0 at the first (or last) digit'''
+    _check_int(n)
+    digits = _digit_string(abs(n))
+    if not 0 <= index < len(digits):
+        raise IndexError(f'Digit index {index} out of range for {len(digits)} digits')
+    return int(digits[-1 - index] if from_right else digits[index])
+
+################################################################################
+# Helper functions
+def _check_int(n) -> None:
+    if not isinstance(n, int):
+        raise TypeError(f'Expected an integer, got {type(n).__name__}')
+
+def _split_size(size: int, leaf: int) -> int:
+    '''Size of the low part when splitting size, a power of two times leaf
+
+    Using the same sizes for all values lets the cached powers be reused
+    '''
+    half = leaf
+    while 2 * half < size:
+        half *= 2
+    return half
+
+@functools.lru_cache(maxsize=64)
+def _pow10(k: int) -> int:
+    return 10**k
+
+@functools.lru_cache(maxsize=64)
+def _pow2_decimal(k: int) -> decimal.Decimal:
+    if k <= _LEAF_BITS:
+        return decimal.Decimal(1 << k)
+    half = _pow2_decimal(k // 2)
+    return _EXACT.multiply(half, _pow2_decimal(k - k // 2))
+
+def _digit_string(n: int) -> str:
+    '''Decimal digits of non-negative n, without the int -> str limit'''
+    if n.bit_length() <= _LEAF_BITS:
+        return str(n)
+    # Decimals print their integer digits in linear time
+    return str(_to_decimal(n))
+
+def _to_decimal(n: int) -> decimal.Decimal:
+    if n.bit_length() <= _LEAF_BITS:
+        return decimal.Decimal(n)
+    shift = _split_size(n.bit_length(), _LEAF_BITS)
+    hi = n >> shift
+    lo = n - (hi << shift)
+    return _EXACT.add(
+        _EXACT.multiply(_to_decimal(hi), _pow2_decimal(shift)),
+        _to_decimal(lo),
+    )
+
+def _int_from_digits(digits: str) -> int:
+    '''Integer value of a string of decimal digits'''
+    if len(digits) <= _LEAF_DIGITS:
+        return int(digits)
+    shift = _split_size(len(digits), _LEAF_DIGITS)
+    hi = _int_from_digits(digits[:-shift])
+    return hi * _pow10(shift) + _int_from_digits(digits[-shift:])
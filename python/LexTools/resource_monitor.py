@@ -0,0 +1,195 @@
+'''
+Background sampling of the resource use of a process and its children
+
+Samples are stored in a preallocated ring buffer so monitoring long runs
+uses constant memory, keeping the most recent `capacity` samples. They are
+saved as CSV or compressed NPZ (requires numpy) when the monitor stops.
+
+How to use:
+```
+monitor = start(output_path=odir/'resource_usage.csv', interval=1)
+... # Run. The monitor stops and saves its samples at exit.
+```
+'''
+# Standard library
+import array
+import atexit
+import csv
+import logging
+from pathlib import Path
+import threading
+import time
+from typing import Optional
+
+# 3rd party
+import psutil
+
+# Globals
+log = logging.getLogger(__name__)
+FIELDS = (
+    'time',        # Seconds since the monitor started
+    'cpu_percent', # Summed over processes so can exceed 100
+    'rss_bytes',
+    'n_fds',       # Open file descriptors (0 on Windows)
+    'read_bytes',  # Cumulative bytes read from storage
+    'write_bytes', # Cumulative bytes written to storage
+    'n_threads',
+    'n_processes',
+)
+
+################################################################################
+def start(output_path: Optional[Path] = None, **kwargs) -> 'ResourceMonitor':
+    '''Start a ResourceMonitor saving its samples to output_path when stopped'''
+    monitor = ResourceMonitor(output_path=output_path, **kwargs)
+    monitor.start()
+    return monitor
+
+class ResourceMonitor:
+    '''Sample resource use of this process tree in a background thread
+
+    Parameters
+    ==========
+    interval:
+        Seconds between samples
+    capacity:
+        Number of most recent samples kept
+    children:
+        Include child processes (e.g. process pool workers), recursively
+    output_path:
+        Save samples to this .csv or .npz file when stopped
+    '''
+    def __init__(
+        self,
+        interval: float = 1.0,
+        capacity: int = 86_400,
+        children: bool = True,
+        output_path: Optional[Path] = None,
+    ):
+        self.interval = interval
+        self.capacity = capacity
+        self.children = children
+        self.output_path = output_path
+        self.n_samples = 0 # Including samples overwritten in the buffer
+        # Samples are rows of len(FIELDS) doubles, allocated once
+        self._buffer = array.array('d', bytes(8 * capacity * len(FIELDS)))
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._process = psutil.Process()
+        self._processes = {} # pid -> Process, kept for cpu_percent() deltas
+        self._start_time = None
+
+    def start(self) -> None:
+        '''Start sampling, stopping automatically at exit'''
+        if self._thread is not None:
+            return
+        self._start_time = time.monotonic()
+        self.sample() # Sets the reference for CPU use
+        self._thread = threading.Thread(
+            target=self._run, name='resource_monitor', daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self) -> None:
+        '''Stop sampling and save samples to output_path if provided'''
+        if self._thread is None:
+            return
+        atexit.unregister(self.stop)
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        if self.output_path is not None:
+            self.save(self.output_path)
+            log.info('Resource usage saved: %s', self.output_path)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self) -> None:
+        '''Record one sample of the process tree'''
+        processes = [self._process]
+        if self.children:
+            try:
+                processes += self._process.children(recursive=True)
+            except psutil.Error:
+                pass
+        totals = [0.0] * len(FIELDS)
+        totals[0] = time.monotonic() - self._start_time
+        alive = {}
+        for proc in processes:
+            # Reuse Process objects so cpu_percent() measures since last sample
+            proc = self._processes.get(proc.pid, proc)
+            try:
+                with proc.oneshot():
+                    totals[1] += proc.cpu_percent()
+                    totals[2] += proc.memory_info().rss
+                    totals[3] += proc.num_fds() if hasattr(proc, 'num_fds') else 0
+                    try:
+                        counters = proc.io_counters()
+                        totals[4] += counters.read_bytes
+                        totals[5] += counters.write_bytes
+                    except (psutil.AccessDenied, AttributeError):
+                        pass # Not permitted or supported (e.g. macOS)
+                    totals[6] += proc.num_threads()
+                    totals[7] += 1
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+            alive[proc.pid] = proc
+        self._processes = alive
+
+        with self._lock:
+            start = (self.n_samples % self.capacity) * len(FIELDS)
+            self._buffer[start:start+len(FIELDS)] = array.array('d', totals)
+            self.n_samples += 1
+
+    def samples(self) -> list[tuple]:
+        '''Samples kept in the buffer as FIELDS tuples, oldest first'''
+        n_fields = len(FIELDS)
+        with self._lock:
+            n_kept = min(self.n_samples, self.capacity)
+            first = (self.n_samples - n_kept) % self.capacity
+            order = [(first + i) % self.capacity for i in range(n_kept)]
+            return [tuple(self._buffer[i*n_fields:(i+1)*n_fields]) for i in order]
+
+    def save(self, path: Path) -> None:
+        '''Save samples as .csv or compressed .npz with one array per field'''
+        path = Path(path)
+        samples = self.samples()
+        if path.suffix == '.npz':
+            import numpy as np
+            columns = np.array(samples, dtype=np.float64).reshape(-1, len(FIELDS))
+            np.savez_compressed(path, **dict(zip(FIELDS, columns.T)))
+        elif path.suffix == '.csv':
+            with open(path, 'w', newline='') as ofile:
+                writer = csv.writer(ofile)
+                writer.writerow(FIELDS)
+                for sample in samples:
+                    # Time and CPU use are the only non-integer fields
+                    writer.writerow([f'{sample[0]:.6g}', f'{sample[1]:.6g}']
+                                    + [int(x) for x in sample[2:]])
+        else:
+            raise ValueError(f'Unsupported resource usage format {path.suffix!r}: {path}')
+
+################################################################################
+# PyTests to be moved into tests/ if added to project
+def test_resource_monitor(tmp_path):
+    import pytest
+    monitor = ResourceMonitor(interval=0.01, capacity=5)
+    monitor.start()
+    time.sleep(0.2)
+    monitor.stop()
+    monitor.stop()
+    assert monitor.n_samples > 5
+    samples = monitor.samples()
+    assert len(samples) == 5
+    times = [sample[0] for sample in samples]
+    assert times == sorted(times)
+    assert all(sample[2] > 0 and sample[7] == 1 for sample in samples)
+
+    monitor.save(tmp_path/'usage.csv')
+    lines = (tmp_path/'usage.csv').read_text().splitlines()
+    assert lines[0] == ','.join(FIELDS) and len(lines) == 6
+    with pytest.raises(ValueError):
+        monitor.save(tmp_path/'usage.txt')
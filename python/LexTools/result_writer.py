@@ -0,0 +1,228 @@
+'''
+Append-only writers streaming result rows to CSV, JSON lines or Parquet
+
+Rows are buffered and written every `flush_every` rows, so results never all
+sit in memory and a crash loses at most one buffer. Reopening the output of a
+crashed run with append=True continues it, and read_rows() returns the rows
+written so far (e.g. to skip inputs that were already processed).
+
+The format is chosen by the file suffix:
+    .csv     : Comma separated values with a header row
+    .jsonl   : One JSON object per line
+    .parquet : Directory with one Parquet file per flush (requires pyarrow).
+               A single Parquet file is unreadable until its footer is written
+               on close, so it could not be resumed after a crash.
+
+How to use:
+```
+with open_writer(path, ['image', 'score'], append=resume) as writer:
+    for name, score in results:
+        writer.write({'image' : name, 'score' : score})
+```
+'''
+# Standard library
+import csv
+import io
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Iterable, Iterator
+
+# Local
+if __package__:
+    from . import file_utils
+else:
+    import file_utils
+
+# Globals
+log = logging.getLogger(__name__)
+
+################################################################################
+def open_writer(
+    path: Path,
+    fields: list[str],
+    flush_every: int = 100,
+    append: bool = False,
+) -> 'ResultWriter':
+    '''Open a writer for the format given by the suffix of path
+
+    Parameters
+    ==========
+    path:
+        Output file (or directory for Parquet)
+    fields:
+        Column names, in order
+    flush_every:
+        Number of rows buffered before writing them
+    append:
+        Continue existing output instead of replacing it. Any partial row
+        left by a crash is removed first.
+    '''
+    return _writer_class(path)(path, fields, flush_every, append)
+
+def read_rows(path: Path) -> Iterator[dict]:
+    '''Read rows written by a ResultWriter, ignoring any partial last row'''
+    return _writer_class(path).read(path)
+
+def _writer_class(path: Path) -> type:
+    suffix = Path(path).suffix
+    for cls in WRITERS:
+        if suffix == cls.suffix:
+            return cls
+    raise ValueError(f'Unsupported result file format {suffix!r}: {path}')
+
+class ResultWriter:
+    '''Base class buffering rows and writing them in batches'''
+    suffix = None
+
+    def __init__(self, path: Path, fields: list[str], flush_every: int, append: bool):
+        self.path = Path(path)
+        self.fields = list(fields)
+        self.flush_every = flush_every
+        self.n_rows = 0 # Rows written by this writer, including buffered rows
+        self._buffer = []
+
+    def write(self, row: dict) -> None:
+        self._buffer.append(row)
+        self.n_rows += 1
+        if len(self._buffer) >= self.flush_every:
+            self.flush()
+
+    def write_rows(self, rows: Iterable[dict]) -> None:
+        for row in rows:
+            self.write(row)
+
+    def flush(self) -> None:
+        '''Write buffered rows through to the operating system'''
+        if self._buffer:
+            self._write(self._buffer)
+            self._buffer = []
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self) -> 'ResultWriter':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        # Rows buffered before an exception are still valid results
+        self.close()
+
+    def _write(self, rows: list[dict]) -> None:
+        raise NotImplementedError
+
+    @classmethod
+    def read(cls, path: Path) -> Iterator[dict]:
+        raise NotImplementedError
+
+class _LineWriter(ResultWriter):
+    '''Text formats with one row per line'''
+    def __init__(self, path: Path, fields: list[str], flush_every: int, append: bool):
+        super().__init__(path, fields, flush_every, append)
+        if append and self.path.is_file():
+            _truncate_partial_line(self.path)
+        new_file = not (append and self.path.is_file() and self.path.stat().st_size)
+        self._file = open(self.path, 'w' if new_file else 'a', newline='')
+        if new_file:
+            self._write_header()
+
+    def _write(self, rows: list[dict]) -> None:
+        self._file.write(''.join(self._format(row) for row in rows))
+        self._file.flush()
+
+    def close(self) -> None:
+        super().close()
+        self._file.close()
+
+    def _write_header(self) -> None:
+        pass
+
+    def _format(self, row: dict) -> str:
+        raise NotImplementedError
+
+    @classmethod
+    def _complete_lines(cls, path: Path) -> Iterator[str]:
+        with open(path, newline='') as ifile:
+            for line in ifile:
+                if line.endswith('\n'):
+                    yield line
+
+def _truncate_partial_line(path: Path) -> None:
+    '''Remove an incomplete last line left by a crash'''
+    with open(path, 'rb+') as ofile:
+        size = ofile.seek(0, os.SEEK_END)
+        end = size
+        while end > 0:
+            start = max(0, end - 65536)
+            ofile.seek(start)
+            newline = ofile.read(end - start).rfind(b'\n')
+            if newline >= 0:
+                end = start + newline + 1
+                break
+            end = start
+        if end < size:
+            log.warning('Removing partial last row from %s', path)
+            ofile.truncate(end)
+
+class CSVWriter(_LineWriter):
+    suffix = '.csv'
+
+    def _write_header(self) -> None:
+        self._file.write(self._format(dict(zip(self.fields, self.fields))))
+
+    def _format(self, row: dict) -> str:
+        line = io.StringIO()
+        csv.DictWriter(line, self.fields, lineterminator='\n').writerow(row)
+        return line.getvalue()
+
+    @classmethod
+    def read(cls, path: Path) -> Iterator[dict]:
+        # NOTE: Values are read back as strings
+        yield from csv.DictReader(cls._complete_lines(path))
+
+class JSONLinesWriter(_LineWriter):
+    suffix = '.jsonl'
+
+    def _format(self, row: dict) -> str:
+        return json.dumps({field : row[field] for field in self.fields}) + '\n'
+
+    @classmethod
+    def read(cls, path: Path) -> Iterator[dict]:
+        for line in cls._complete_lines(path):
+            yield json.loads(line)
+
+class ParquetWriter(ResultWriter):
+    suffix = '.parquet'
+
+    def __init__(self, path: Path, fields: list[str], flush_every: int, append: bool):
+        super().__init__(path, fields, flush_every, append)
+        if self.path.is_dir() and not append:
+            for part in self._parts(self.path):
+                part.unlink()
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._n_parts = len(self._parts(self.path))
+
+    def _write(self, rows: list[dict]) -> None:
+        # Imported here as pyarrow is slow to import and only needed for Parquet
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.Table.from_pylist(rows).select(self.fields)
+        opath = self.path/f'part-{self._n_parts:06d}.parquet'
+        # Readers only see complete parts
+        with file_utils.atomic_path(opath) as tmp_path:
+            pq.write_table(table, tmp_path)
+        self._n_parts += 1
+
+    @staticmethod
+    def _parts(path: Path) -> list[Path]:
+        return sorted(path.glob('part-*.parquet'))
+
+    @classmethod
+    def read(cls, path: Path) -> Iterator[dict]:
+        import pyarrow.parquet as pq
+        for part in cls._parts(Path(path)):
+            yield from pq.read_table(part).to_pylist()
+
+WRITERS = (CSVWriter, JSONLinesWriter, ParquetWriter)
+SUFFIXES = tuple(cls.suffix for cls in WRITERS)
@@ -0,0 +1,327 @@
+'''
+Memoization of script runs and run stages
+
+A run is identified by a hash of its canonicalized configuration, the version
+control state and fingerprints of its input files. When an identical run was
+cached, its outputs are restored instead of recomputed. Individual stages of
+a run can be memoized the same way with RunCache.stage().
+
+How to use:
+```
+cache = RunCache(cache_dir, max_bytes=10e9)
+key = run_key(cfg, git_state, input_paths)
+if not cache.restore(key, odir):
+    ... # Run and save outputs in odir
+    cache.store(key, odir, ['scores.csv'])
+    cache.evict()
+```
+'''
+# Standard library
+from collections.abc import Callable, Iterable
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+import pickle
+import shutil
+import time
+from typing import Any, Optional
+
+# Local
+if __package__:
+    from . import file_utils
+else:
+    import file_utils
+
+# Globals
+log = logging.getLogger(__name__)
+MANIFEST = 'run_cache_manifest.json'
+
+################################################################################
+def canonical_json(obj: Any) -> str:
+    '''JSON string that is identical for equal configurations'''
+    return json.dumps(obj, sort_keys=True, separators=(',', ':'), default=str)
+
+def fingerprint_files(paths: Iterable[Path], content: bool = False) -> list:
+    '''Identify files by path, size and modification time
+
+    Set content to also hash the file contents, which is robust to files
+    being touched or copied but requires reading every file.
+    '''
+    fingerprints = []
+    for path in paths:
+        stat = os.stat(path)
+        fingerprint = [str(path), stat.st_size, stat.st_mtime_ns]
+        if content:
+            fingerprint.append(hash_file(path))
+        fingerprints.append(fingerprint)
+    return fingerprints
+
+def hash_file(path: Path) -> str:
+    '''SHA-256 of file contents, read in chunks'''
+    digest = hashlib.sha256()
+    with open(path, 'rb') as ifile:
+        for chunk in iter(lambda: ifile.read(1024*1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def hash_paths(paths: Iterable[Path], exclude: Iterable[Path] = ()) -> str:
+    '''Hash of the names and contents of files and of all files in directories
+
+    Files below the exclude directories (e.g. the output directory) are
+    skipped. Missing files are hashed by name only.
+    '''
+    exclude = {Path(p).resolve() for p in exclude}
+    digest = hashlib.sha256()
+    for path in sorted(Path(p) for p in paths):
+        for fpath in _walk_files(path, exclude):
+            try:
+                content_hash = hash_file(fpath)
+            except (FileNotFoundError, IsADirectoryError):
+                content_hash = None
+            digest.update(canonical_json([str(fpath), content_hash]).encode())
+    return digest.hexdigest()
+
+def _walk_files(path: Path, exclude: set[Path]) -> Iterable[Path]:
+    '''Files at or below path, in sorted order'''
+    resolved = path.resolve()
+    if resolved in exclude or exclude.intersection(resolved.parents):
+        return
+    if not path.is_dir() or path.is_symlink():
+        yield path
+        return
+    for dpath, dnames, fnames in os.walk(path):
+        dnames[:] = sorted(d for d in dnames if (Path(dpath)/d).resolve() not in exclude)
+        for fname in sorted(fnames):
+            yield Path(dpath)/fname
+
+def run_key(cfg: Any, git_state: Any, input_paths: Iterable[Path]) -> str:
+    '''Hash identifying a run
+
+    Parameters
+    ==========
+    cfg:
+        Merged configuration, excluding settings that do not change outputs
+        (e.g. output directory, logging)
+    git_state:
+        Version control state (e.g. commit hash and hash of uncommitted diff)
+    input_paths:
+        Input files, fingerprinted by path, size and modification time
+    '''
+    key = canonical_json([cfg, git_state, fingerprint_files(input_paths)])
+    return hashlib.sha256(key.encode()).hexdigest()
+
+################################################################################
+class RunCache:
+    '''Directory of cached run outputs and stage results
+
+    Parameters
+    ==========
+    cache_dir:
+        Directory holding the cache, which can be shared by many processes
+    max_age:
+        Seconds since last use after which evict() removes entries
+    max_bytes:
+        Total size above which evict() removes least recently used entries
+    '''
+    def __init__(
+        self,
+        cache_dir: Path,
+        max_age: Optional[float] = None,
+        max_bytes: Optional[float] = None,
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        (self.cache_dir/'runs').mkdir(parents=True, exist_ok=True)
+        (self.cache_dir/'stages').mkdir(parents=True, exist_ok=True)
+
+    def restore(self, key: str, odir: Path) -> bool:
+        '''Copy outputs of a cached run into odir, returning False if not cached'''
+        entry = self.cache_dir/'runs'/key
+        try:
+            names = json.loads((entry/MANIFEST).read_text())['outputs']
+        except FileNotFoundError:
+            return False
+        copied = []
+        try:
+            for name in names:
+                copied.append(odir/name)
+                _copy(entry/name, odir/name)
+        except (FileNotFoundError, shutil.Error) as err:
+            # Evicted by another process while copying
+            log.debug('Cached run %s removed while restoring: %s', key, err)
+            for path in copied:
+                file_utils.remove(path)
+                # Parent directories created by _copy(), if left empty
+                for parent in path.relative_to(odir).parents[:-1]:
+                    try:
+                        (odir/parent).rmdir()
+                    except OSError:
+                        break
+            return False
+        _touch(entry)
+        log.info('Restored %d cached outputs of run %s', len(names), key)
+        return True
+
+    def store(self, key: str, odir: Path, names: Iterable[str]) -> None:
+        '''Cache outputs of a run, given by their file or directory paths relative to odir'''
+        names = list(names)
+        entry = self.cache_dir/'runs'/key
+        if entry.is_dir():
+            return
+        # Other processes never see incomplete entries. An entry stored by
+        # another process in the meantime is kept.
+        with file_utils.atomic_path(entry, exist_ok=True) as tmp_entry:
+            tmp_entry.mkdir()
+            for name in names:
+                _copy(odir/name, tmp_entry/name)
+            (tmp_entry/MANIFEST).write_text(json.dumps({
+                'outputs' : names, 'created' : time.time(),
+            }))
+        log.debug('Cached %d outputs of run %s', len(names), key)
+
+    def stage(
+        self,
+        name: str,
+        key: Any,
+        func: Callable,
+        *args,
+        **kwargs,
+    ) -> Any:
+        '''Return the cached result of a stage or compute and cache it
+
+        The result must be picklable. The stage is identified by its name and
+        key (e.g. the configuration section and input fingerprints), not by
+        the arguments passed to func.
+        '''
+        key_hash = hashlib.sha256(canonical_json([name, key]).encode()).hexdigest()
+        path = self.cache_dir/'stages'/f'{name}-{key_hash}.pickle'
+        try:
+            with open(path, 'rb') as ifile:
+                result = pickle.load(ifile)
+            _touch(path)
+            log.debug('Using cached result of stage %s', name)
+            return result
+        except FileNotFoundError:
+            pass
+        result = func(*args, **kwargs)
+        # Threads may compute the same stage at once
+        with file_utils.atomic_path(path, exist_ok=True) as tmp_path:
+            with open(tmp_path, 'wb') as ofile:
+                pickle.dump(result, ofile, protocol=pickle.HIGHEST_PROTOCOL)
+        return result
+
+    def evict(self) -> None:
+        '''Remove entries unused for max_age or beyond max_bytes in total'''
+        entries = []
+        for subdir in ('runs', 'stages'):
+            for entry in (self.cache_dir/subdir).iterdir():
+                if entry.name.endswith('.tmp'):
+                    continue
+                entries.append((entry.stat().st_mtime, _size(entry), entry))
+        entries.sort() # Least recently used first
+
+        now = time.time()
+        total_bytes = sum(size for _, size, _ in entries)
+        n_evicted = 0
+        for last_used, size, entry in entries:
+            too_old = self.max_age is not None and now - last_used > self.max_age
+            too_big = self.max_bytes is not None and total_bytes > self.max_bytes
+            if not (too_old or too_big):
+                continue
+            file_utils.remove(entry)
+            total_bytes -= size
+            n_evicted += 1
+        if n_evicted:
+            log.debug('Evicted %d run cache entries', n_evicted)
+
+def _copy(src: Path, dst: Path) -> None:
+    # Not hard linked so modifying outputs in place cannot corrupt the cache
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    if src.is_dir():
+        shutil.copytree(src, dst, dirs_exist_ok=True)
+    else:
+        shutil.copy2(src, dst)
+
+def _touch(path: Path) -> None:
+    '''Mark an entry as recently used'''
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+def _size(path: Path) -> int:
+    if path.is_file():
+        return path.stat().st_size
+    return sum(p.stat().st_size for p in path.rglob('*') if p.is_file())
+
+################################################################################
+# PyTests to be moved into tests/ if added to project
+def test_run_cache(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+    inputs = tmp_path/'input.txt'
+    inputs.write_text('INPUT\n')
+    cfg = {'B' : [1, 2], 'A' : {'X' : 1}}
+    key = run_key(cfg, 'abc123', [inputs])
+    assert key == run_key({'A' : {'X' : 1}, 'B' : [1, 2]}, 'abc123', [inputs])
+    assert key != run_key(cfg, 'abc124', [inputs])
+
+    cache = RunCache(tmp_path/'cache')
+    odir1 = tmp_path/'run1'
+    (odir1/'debug').mkdir(parents=True)
+    (odir1/'scores.csv').write_text('1,2\n')
+    (odir1/'debug/image.txt').write_text('DEBUG\n')
+    odir2 = tmp_path/'run2'
+    odir2.mkdir()
+    assert not cache.restore(key, odir2)
+    cache.store(key, odir1, ['scores.csv', 'debug/image.txt'])
+    assert cache.restore(key, odir2)
+    assert (odir2/'scores.csv').read_text() == '1,2\n'
+    assert (odir2/'debug/image.txt').read_text() == 'DEBUG\n'
+
+    # Restoring an entry evicted by another process fails cleanly
+    shutil.rmtree(cache.cache_dir/'runs'/key/'debug')
+    odir3 = tmp_path/'run3'
+    assert not cache.restore(key, odir3)
+    assert not any(odir3.iterdir())
+    cache.store(key, odir1, ['scores.csv', 'debug/image.txt'])
+    assert not cache.restore(key, odir3) # Stored entries are not replaced
+    shutil.rmtree(cache.cache_dir/'runs'/key)
+    cache.store(key, odir1, ['scores.csv', 'debug/image.txt'])
+
+    # File contents hashed, skipping excluded directories
+    untracked = [tmp_path/'run1', tmp_path/'input.txt']
+    paths_hash = hash_paths(untracked, exclude=[odir1/'debug'])
+    (odir1/'debug/image.txt').write_text('CHANGED DEBUG\n')
+    assert hash_paths(untracked, exclude=[odir1/'debug']) == paths_hash
+    (odir1/'scores.csv').write_text('1,3\n')
+    assert hash_paths(untracked, exclude=[odir1/'debug']) != paths_hash
+
+    # Changed inputs change the key
+    inputs.write_text('CHANGED INPUT\n')
+    assert run_key(cfg, 'abc123', [inputs]) != key
+
+    # Stage results
+    calls = []
+    def stage(x):
+        calls.append(x)
+        return x * 2
+    assert cache.stage('double', {'x' : 2}, stage, 2) == 4
+    assert cache.stage('double', {'x' : 2}, stage, 2) == 4
+    assert calls == [2]
+    # Threads computing the same stage at once
+    with ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(
+            lambda x: cache.stage('double', {'x' : 3}, stage, x), [3]*8
+        ))
+    assert results == [6]*8
+    assert not list((tmp_path/'cache/stages').glob('*.tmp'))
+
+    # Eviction
+    cache.evict()
+    assert cache.restore(key, odir2)
+    RunCache(tmp_path/'cache', max_bytes=0).evict()
+    assert not cache.restore(key, odir2)
+    assert not any((tmp_path/'cache/stages').iterdir())
@@ -3,38 +3,53 @@
 <TODO> Module docstring
 '''
 # Standard library
+import collections
+import collections.abc
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 import configparser
 import copy
+import hashlib
+import itertools
 import json
 import logging
+import os
 from pathlib import Path
+import pickle
+import queue
+import re
 try:
     import tomllib # Added in python 3.11
 except ImportError:
     import tomli as tomllib # 3rd party
-from typing import Iterable, Optional
+from typing import Any, Callable, Iterable, Iterator, Optional
 import time
+import threading
 import shutil
 
-# 3rd party
-import yaml
-
 # Local
-import user_input
+if __package__:
+    from . import file_utils, user_input, yaml_utils
+else:
+    import file_utils
+    import user_input
+    import yaml_utils
 
 # Globals
 log = logging.getLogger(__name__)
+_TRASH_NAME = re.compile(r'\..+\.deleting-\d+-\d+')
 
 ################################################################################
 # NOTE: Projects are better off choosing a single configuration format so the
 # read and save functions below are mostly a reference for how to read files in
 # the various configuration libraries. Currently, I prefer YAML for configuring
 # scripts though TOML is becoming popular.
-def read_config(path: Path) -> dict:
-    '''Read configuration file'''
+def read_config(path: Path, cache: Optional['ConfigCache'] = None) -> dict:
+    '''Read configuration file, optionally through a ConfigCache'''
+    if cache is not None:
+        return cache.read(path)
     if path.suffix in ('.yaml', '.yml'):
         with path.open('r') as ifile:
-            cfg = yaml.safe_load(ifile)
+            cfg = yaml_utils.safe_load(ifile)
     elif path.suffix == '.json':
         with path.open('r') as ifile:
             cfg = json.load(ifile)
@@ -55,7 +70,7 @@ def save_config(cfg: dict, path: Path) -> None:
     '''Save configuration settings'''
     if path.suffix in ('.yaml', '.yml'):
         with path.open('w') as ofile:
-            yaml.safe_dump(cfg, ofile)
+            yaml_utils.safe_dump(cfg, ofile)
     elif path.suffix == '.json':
         with path.open('w') as ofile:
             json.dump(cfg, ofile)
@@ -64,6 +79,102 @@ def save_config(cfg: dict, path: Path) -> None:
     else:
         raise NotImplementedError(f'Unexpected file format: {path}')
 
+class ConfigCache:
+    '''Cache of parsed configuration files
+
+    Files are identified by (path, size, modification time, inode) so edited
+    files are re-read, unless edited without changing size within the file
+    system's timestamp resolution. Configurations are stored pickled so each
+    read returns a new object (faster than a deepcopy) that callers are free
+    to modify.
+
+    Parameters
+    ==========
+    maxsize:
+        Maximum number of configurations kept in memory
+    cache_dir:
+        Optional directory for also caching configurations on disk, allowing
+        the cache to be shared across processes
+    '''
+    def __init__(self, maxsize: int = 128, cache_dir: Optional[Path] = None):
+        self.maxsize = maxsize
+        self.cache_dir = cache_dir
+        if cache_dir is not None:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+        self._cache = collections.OrderedDict() # key -> pickled config
+        self._lock = threading.Lock()
+
+    def read(self, path: Path) -> dict:
+        '''Read configuration file, parsing it only if not cached'''
+        key = self._key(path)
+        with self._lock:
+            blob = self._cache.get(key)
+            if blob is not None:
+                self._cache.move_to_end(key)
+        if blob is None:
+            blob = self._read_disk(key)
+            if blob is None:
+                cfg = read_config(path)
+                blob = pickle.dumps(cfg, protocol=pickle.HIGHEST_PROTOCOL)
+                self._write_disk(key, blob)
+            with self._lock:
+                # Drop outdated versions of the file
+                for old_key in [k for k in self._cache if k[0] == key[0]]:
+                    del self._cache[old_key]
+                self._cache[key] = blob
+                while len(self._cache) > self.maxsize:
+                    self._cache.popitem(last=False)
+        return pickle.loads(blob)
+
+    def invalidate(self, path: Path) -> None:
+        '''Remove all cached versions of a configuration file'''
+        abspath = os.path.abspath(path)
+        with self._lock:
+            for key in [k for k in self._cache if k[0] == abspath]:
+                del self._cache[key]
+        if self.cache_dir is not None:
+            for cache_path in self.cache_dir.glob(f'{_hash(abspath)}-*.pickle'):
+                cache_path.unlink(missing_ok=True)
+
+    def clear(self) -> None:
+        '''Remove all cached configurations'''
+        with self._lock:
+            self._cache.clear()
+        if self.cache_dir is not None:
+            for cache_path in self.cache_dir.glob('*.pickle'):
+                cache_path.unlink(missing_ok=True)
+
+    @staticmethod
+    def _key(path: Path) -> tuple:
+        stat = os.stat(path)
+        return (os.path.abspath(path), stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+    def _disk_path(self, key: tuple) -> Path:
+        return self.cache_dir / f'{_hash(key[0])}-{_hash(key[1:])}.pickle'
+
+    def _read_disk(self, key: tuple) -> Optional[bytes]:
+        if self.cache_dir is None:
+            return None
+        try:
+            return self._disk_path(key).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def _write_disk(self, key: tuple, blob: bytes) -> None:
+        if self.cache_dir is None:
+            return
+        opath = self._disk_path(key)
+        for old_path in self.cache_dir.glob(f'{_hash(key[0])}-*.pickle'):
+            if old_path != opath:
+                old_path.unlink(missing_ok=True)
+        # Other processes never read partial files. Another writer of the
+        # same key wrote the same content so losing the race is fine.
+        with file_utils.atomic_path(opath, exist_ok=True) as tmp_path:
+            tmp_path.write_bytes(blob)
+
+def _hash(obj) -> str:
+    return hashlib.sha1(repr(obj).encode()).hexdigest()[:16]
+
 def merge_config_files(
     cfgs: Iterable[dict], 
     default_cfg: Optional[dict] = None,
@@ -161,47 +272,533 @@ def update_config(
                 # This will not handle duplicates already in the original or
                 # update. It is assumed the user intends those duplicates.
                 merged_list = original_list.copy()
-                for x in val:
-                    if x not in original_list:
-                        merged_list.append(x)
+                merged_list.extend(new_list_elements(original_list, val))
                 original[key] = merged_list
         else:
             original[key] = val
     
     return original
 
+def new_list_elements(original: list, update: list) -> list:
+    '''Elements of update not in original, keeping the order of update
+
+    Equivalent to `[x for x in update if x not in original]` but uses a set
+    for hashable elements so it scales as O(n+m) instead of O(n*m).
+    Unhashable elements (e.g. dict, list) are compared to the unhashable
+    elements of original one at a time.
+    '''
+    hashable = set()
+    unhashable = []
+    for x in original:
+        try:
+            hashable.add(x)
+        except TypeError:
+            unhashable.append(x)
+
+    new_elements = []
+    for x in update:
+        try:
+            found = x in hashable
+        except TypeError:
+            found = x in unhashable
+        if not found:
+            new_elements.append(x)
+    return new_elements
+
+class LayeredConfig(collections.abc.Mapping):
+    '''Read-only merged view of configuration layers, similar to a ChainMap
+
+    Values are resolved lazily, on first access, with the same rules as
+    update_config(): sub-dictionaries are merged, new list elements are
+    appended and other values are overwritten. Layers are never copied or
+    modified, so they must not be modified while the view is in use. Call
+    to_dict() for an independent plain dictionary (e.g. for saving).
+
+    Parameters
+    ==========
+    layers:
+        Configurations in increasing priority (e.g. default configuration,
+        user configuration files, command line overrides)
+    allow_new_keys:
+        Allow layers to contain keys not in the layers below them. Checking
+        only walks the layers after the first.
+    '''
+    def __init__(self, *layers: dict, allow_new_keys: bool = True):
+        self.layers = layers
+        self.allow_new_keys = allow_new_keys
+        self._resolved = {}
+        if not allow_new_keys:
+            for i in range(1, len(layers)):
+                _check_new_keys(layers[:i], layers[i])
+
+    def new_child(self, layer: dict) -> 'LayeredConfig':
+        '''New view with an additional highest priority layer'''
+        return LayeredConfig(
+            *self.layers, layer, allow_new_keys=self.allow_new_keys
+        )
+
+    def __getitem__(self, key):
+        try:
+            return self._resolved[key]
+        except KeyError:
+            pass
+        values = [layer[key] for layer in self.layers if key in layer]
+        if not values:
+            raise KeyError(key)
+        self._resolved[key] = value = _resolve_layers(values)
+        return value
+
+    def __iter__(self):
+        seen = set()
+        for layer in self.layers:
+            for key in layer:
+                if key not in seen:
+                    seen.add(key)
+                    yield key
+
+    def __len__(self):
+        return len(set().union(*self.layers))
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.to_dict()!r})'
+
+    def to_dict(self) -> dict:
+        '''Merge all layers into a new dictionary'''
+        merged = {}
+        for key, val in self.items():
+            if isinstance(val, LayeredConfig):
+                val = val.to_dict()
+            elif isinstance(val, list):
+                val = [copy.deepcopy(x) if isinstance(x, (dict, list)) else x for x in val]
+            merged[key] = val
+        return merged
+
+def _resolve_layers(values: list):
+    '''Merge the values of a key from all layers, following update_config()'''
+    top = values[-1]
+    if not isinstance(top, (dict, list)):
+        return top
+    # Only the run of dictionaries (or lists) at the top is merged. Lower
+    # values were overwritten and None is treated as empty.
+    merged_type = dict if isinstance(top, dict) else list
+    n_merged = 1
+    for val in reversed(values[:-1]):
+        if not isinstance(val, merged_type):
+            break
+        n_merged += 1
+    merged = values[-n_merged:]
+    if isinstance(top, dict):
+        return LayeredConfig(*merged)
+    merged_list = merged[0]
+    for val in merged[1:]:
+        merged_list = merged_list + new_list_elements(merged_list, val)
+    return merged_list
+
+def _check_new_keys(lower: Iterable[dict], update: dict, path: str = '') -> None:
+    for key, val in update.items():
+        below = [layer[key] for layer in lower if key in layer]
+        if not below:
+            raise KeyError(f'{path}{key!r} not in original dictionary')
+        if not isinstance(val, dict):
+            continue
+        # New keys are allowed if the value below is not a dictionary (e.g. None)
+        lower_dicts = []
+        for val_below in reversed(below):
+            if not isinstance(val_below, dict):
+                break
+            lower_dicts.insert(0, val_below)
+        if lower_dicts:
+            _check_new_keys(lower_dicts, val, f'{path}{key!r} -> ')
+
+class ConfigError(ValueError):
+    '''Invalid configuration, listing every error found'''
+    def __init__(self, errors: list[str]):
+        self.errors = errors
+        super().__init__(
+            f'{len(errors)} configuration error(s):\n'
+            + '\n'.join(f' - {err}' for err in errors)
+        )
+
+def compile_schema(schema: Any) -> Callable[[collections.abc.Mapping], None]:
+    '''Compile a configuration schema into a validation function
+
+    The schema mirrors the layout of the configuration:
+    - dict: mapping with exactly these keys, each validated by its value's
+      schema. The key `...` (Ellipsis) allows other keys, validated by its
+      value's schema (e.g. `{... : object}` for any keys).
+    - [schema]: list with all elements matching schema
+    - type: isinstance() check, with None meaning type(None). bool values
+      only match bool (or object), not int.
+    - tuple: value matches any one of the schemas (e.g. `(str, None)`)
+    - set: value is one of the set elements
+    - other callables: called with the value, returning an error message or
+      None if the value is valid
+
+    The returned function checks a configuration in a single pass, raising
+    ConfigError listing all errors with the path to each value.
+    '''
+    check = _compile_schema(schema)
+    def validate(cfg: collections.abc.Mapping) -> None:
+        errors = []
+        check(cfg, '', errors)
+        if errors:
+            raise ConfigError(errors)
+    return validate
+
+def _compile_schema(schema: Any) -> Callable[[Any, str, list], None]:
+    '''Convert schema into a function appending errors for a value to a list'''
+    if schema is None:
+        schema = type(None)
+
+    if isinstance(schema, dict):
+        key_checks = {
+            key : _compile_schema(val) for key, val in schema.items() if key is not ...
+        }
+        extra_check = _compile_schema(schema[...]) if ... in schema else None
+        def check_dict(value, path, errors):
+            if not isinstance(value, collections.abc.Mapping):
+                errors.append(f'{path or "config"}: expected mapping, got {type(value).__name__}')
+                return
+            for key, check in key_checks.items():
+                if key in value:
+                    check(value[key], _key_path(path, key), errors)
+                else:
+                    errors.append(f'{_key_path(path, key)}: missing')
+            for key in value.keys() - key_checks.keys():
+                key_path = _key_path(path, key)
+                if extra_check is None:
+                    errors.append(f'{key_path}: unexpected key')
+                else:
+                    extra_check(value[key], key_path, errors)
+        return check_dict
+
+    if isinstance(schema, list):
+        if len(schema) != 1:
+            raise ValueError(f'List schema must have exactly one element: {schema}')
+        element_check = _compile_schema(schema[0])
+        def check_list(value, path, errors):
+            if not isinstance(value, list):
+                errors.append(f'{path}: expected list, got {type(value).__name__}')
+                return
+            for i, element in enumerate(value):
+                element_check(element, f'{path}[{i}]', errors)
+        return check_list
+
+    if isinstance(schema, tuple):
+        schema = tuple(type(None) if s is None else s for s in schema)
+        if all(isinstance(s, type) for s in schema):
+            # Faster than checking the schemas one by one
+            return _compile_schema_types(schema)
+        checks = [_compile_schema(s) for s in schema]
+        def check_any(value, path, errors):
+            options_errors = []
+            for check in checks:
+                option_errors = []
+                check(value, path, option_errors)
+                if not option_errors:
+                    return
+                options_errors += option_errors
+            errors.append(f'{path}: no valid option ({"; ".join(options_errors)})')
+        return check_any
+
+    if isinstance(schema, (set, frozenset)):
+        choices = frozenset(schema)
+        def check_choice(value, path, errors):
+            try:
+                valid = value in choices
+            except TypeError: # unhashable value
+                valid = False
+            if not valid:
+                valid_choices = ', '.join(sorted(map(repr, choices)))
+                errors.append(f'{path}: {value!r} not one of {valid_choices}')
+        return check_choice
+
+    if isinstance(schema, type):
+        return _compile_schema_types((schema,))
+
+    if callable(schema):
+        def check_callable(value, path, errors):
+            msg = schema(value)
+            if msg:
+                errors.append(f'{path}: {msg}')
+        return check_callable
+
+    raise TypeError(f'Unexpected schema: {schema!r}')
+
+def _key_path(path: str, key: Any) -> str:
+    return f'{path}.{key}' if path else str(key)
+
+def _compile_schema_types(types: tuple) -> Callable[[Any, str, list], None]:
+    expected = ' or '.join(t.__name__ for t in types)
+    # bool subclasses int but True is not a valid int setting
+    reject_bool = bool not in types and object not in types
+    def check_type(value, path, errors):
+        if not isinstance(value, types) or (reject_bool and isinstance(value, bool)):
+            errors.append(f'{path}: expected {expected}, got {type(value).__name__}')
+    return check_type
+
 def require_empty_dir(
     path: Path,
     parents: bool = False,
     overwrite: bool = False,
-) -> None:
+    background_delete: bool = False,
+) -> Optional[Future]:
+    '''Make sure path is an empty directory, deleting contents if allowed
+
+    Parameters
+    ==========
+    path:
+        Directory to create or empty
+    parents:
+        Create missing parent directories
+    overwrite:
+        Delete existing contents without asking the user for permission
+    background_delete:
+        Rename the existing directory aside and delete it in background
+        threads so the program can start using path right away. The threads
+        do not delay exiting so wait on the returned future if the deletion
+        must finish (see delete_in_background()). Directories left aside by
+        earlier calls that exited before finishing are deleted too.
+
+    Returns
+    =======
+    Future completing when the background deletion is done, if one started
+    '''
     # Make directory if it doesn't exist or is empty
     if not path.is_dir():
         path.mkdir(parents=parents)
-        return
-    elif not any(path.iterdir()):
-        return
+        return _delete_trash(path) if background_delete else None
+    with os.scandir(path) as entries:
+        if next(entries, None) is None:
+            return _delete_trash(path) if background_delete else None
 
     if not overwrite:
         # Check if user wants to delete contents of directory
         overwrite = user_input.request_permission(f'Delete contents of {path}?')
 
-    files = list(path.rglob('*'))
-    if overwrite:
-        log.warning('Deleting all %d files from %s', len(files), path)
+    if not overwrite:
+        n_files, example = count_dir_entries(path)
+        raise FileExistsError(f'{n_files} files found (e.g. {example}): {path}')
+
+    if background_delete:
+        log.warning('Deleting all files from %s in the background', path)
         time.sleep(2) # Give the user a moment to realize if this was a mistake
-        shutil.rmtree(path)
-        path.mkdir(parents=parents)
+        # Renaming within the same directory is atomic and does not depend on
+        # the number of files
+        trash = path.with_name(f'{_trash_prefix(path)}{os.getpid()}-{time.time_ns()}')
+        os.rename(path, trash)
+        path.mkdir()
+        return _delete_trash(path)
+
+    n_files, _ = count_dir_entries(path)
+    log.warning('Deleting all %d files from %s', n_files, path)
+    time.sleep(2) # Give the user a moment to realize if this was a mistake
+    shutil.rmtree(path)
+    path.mkdir(parents=parents)
+    return None
+
+def trash_dirs(path: Path) -> list[Path]:
+    '''Directories renamed aside from path by require_empty_dir() for deletion
+
+    These are hidden siblings of path still being deleted in the background
+    or left behind by programs that exited first.
+    '''
+    prefix = _trash_prefix(path)
+    try:
+        with os.scandir(path.parent) as entries:
+            return sorted(Path(e.path) for e in entries if e.name.startswith(prefix))
+    except FileNotFoundError:
+        return []
+
+def is_trash_dir(path: Path) -> bool:
+    '''Whether path was renamed aside by require_empty_dir() for deletion
+
+    Judged by name only, so paths already deleted are recognized too
+    '''
+    return _TRASH_NAME.fullmatch(Path(path).name) is not None
+
+def _trash_prefix(path: Path) -> str:
+    return f'.{path.name}.deleting-'
+
+def _delete_trash(path: Path) -> Optional[Future]:
+    '''Delete all directories renamed aside by require_empty_dir() in background
+
+    Directories are left behind when the program exits before their deletion
+    finishes, so each call sweeps them up by moving them into one tree.
+    '''
+    trash = trash_dirs(path)
+    if not trash:
+        return None
+    for stale in trash[1:]:
+        try:
+            os.rename(stale, trash[0]/stale.name)
+        except OSError:
+            pass # e.g. moved or deleted by another process meanwhile
+    return delete_in_background(trash[0])
+
+def count_dir_entries(path: Path) -> tuple[int, Optional[str]]:
+    '''Count all files and directories below path, streaming the listing
+
+    Returns the count and the name of one entry as an example.
+    '''
+    n_entries = 0
+    example = None
+    dirs = [path]
+    while dirs:
+        with os.scandir(dirs.pop()) as entries:
+            for entry in entries:
+                n_entries += 1
+                if example is None:
+                    example = entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append(entry.path)
+    return n_entries, example
+
+def delete_in_background(path: Path, max_workers: int = 8) -> Future:
+    '''Delete a directory tree using background daemon threads
+
+    The threads take directories from a shared queue, deleting their files
+    and queueing their subdirectories, so the work is split at every level of
+    the tree (e.g. a single huge subdirectory). The emptied directories are
+    then removed deepest first.
+
+    The threads are daemons so exiting the interpreter does not wait for
+    the deletion, leaving the rest of the tree in place. Call result() on the
+    returned future to wait for the deletion to finish. Files and directories
+    removed by someone else meanwhile (e.g. another process deleting the same
+    tree) are skipped.
+    '''
+    future = Future()
+    dirs = queue.Queue()
+    found = [str(path)] # Directories are found after their parents
+    errors = []
+
+    def scan():
+        while True:
+            dpath = dirs.get()
+            try:
+                if dpath is None:
+                    return
+                if errors:
+                    continue # Drain the queue after a failure
+                with os.scandir(dpath) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            found.append(entry.path)
+                            dirs.put(entry.path)
+                        else:
+                            try:
+                                os.unlink(entry.path)
+                            except FileNotFoundError:
+                                pass
+            except FileNotFoundError:
+                pass
+            except Exception as err:
+                errors.append(err)
+            finally:
+                dirs.task_done()
+
+    def delete():
+        workers = [
+            threading.Thread(target=scan, name=f'delete_{path.name}_{i}', daemon=True)
+            for i in range(max_workers)
+        ]
+        for worker in workers:
+            worker.start()
+        dirs.put(str(path))
+        dirs.join()
+        for _ in workers:
+            dirs.put(None)
+        try:
+            if errors:
+                raise errors[0]
+            for dpath in reversed(found):
+                try:
+                    os.rmdir(dpath)
+                except FileNotFoundError:
+                    pass
+        except Exception as err:
+            log.error('Failed to delete %s: %s', path, err)
+            future.set_exception(err)
+        else:
+            log.debug('Deleted %d directories from %s', len(found), path)
+            future.set_result(path)
+    threading.Thread(target=delete, name=f'delete_{path.name}', daemon=True).start()
+    return future
+
+################################################################################
+class TaskError(RuntimeError):
+    '''Exception raised by func in parallel_map(), naming the failed item'''
+
+def parallel_map(
+    func: Callable,
+    items: Iterable,
+    executor: str = 'serial',
+    workers: Optional[int] = None,
+    chunksize: int = 1,
+) -> Iterator:
+    '''Apply func to each item in a pool of workers, yielding results in order
+
+    Items are submitted in chunks as results are consumed so only a bounded
+    number of items and results are held in memory at once. Exceptions are
+    re-raised as TaskError naming the item that failed.
+
+    Parameters
+    ==========
+    func:
+        Function of one item. Must be picklable (e.g. a module-level function
+        or functools.partial of one) for the process executor.
+    items:
+        Inputs to func, consumed lazily
+    executor:
+        'serial' (no pool), 'thread' for I/O-bound or GIL-releasing work, or
+        'process' for CPU-bound python code
+    workers:
+        Number of threads or processes. Defaults to the number of CPUs.
+    chunksize:
+        Number of items sent to a worker at once, reducing the overhead per
+        item for the process executor
+    '''
+    if executor == 'serial':
+        for item in items:
+            yield _call_with_context(func, item)
+        return
+
+    workers = workers or os.cpu_count() or 1
+    if executor == 'thread':
+        pool = ThreadPoolExecutor(workers, thread_name_prefix='parallel_map')
+    elif executor == 'process':
+        pool = ProcessPoolExecutor(workers)
     else:
-        raise FileExistsError(
-            f'{len(files)} files found (e.g. {files[0].name}): {path}'
-        )
+        raise ValueError(f'Unknown executor: {executor}')
+
+    items = iter(items)
+    pending = collections.deque()
+    try:
+        while chunk := list(itertools.islice(items, chunksize)):
+            pending.append(pool.submit(_map_with_context, func, chunk))
+            # Keep all workers busy without submitting everything up front
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+def _map_with_context(func: Callable, chunk: list) -> list:
+    return [_call_with_context(func, item) for item in chunk]
+
+def _call_with_context(func: Callable, item: Any) -> Any:
+    try:
+        return func(item)
+    except Exception as err:
+        raise TaskError(f'Failed on {item!r}: {type(err).__name__}: {err}') from err
 
 ################################################################################
 # NOTE: Move the unit tests below into a tests directory when adding this
 # function to a project.
-import pytest
 def test_update_config():
+    import pytest
 
     # Value update 
     original = {'A' : 1, 'B' : 2}
@@ -243,6 +840,12 @@ def test_update_config():
     assert update_config(original, update, concat_lists=True)['A'] == [2,3,2,1]
     # Enable simple overwriting of lists
     assert update_config(original, update, overwrite_lists=True)['A'] == [2,1]
+    # Duplicates and order are preserved, mixing hashable and unhashable types
+    original = {'A' : [1, 'x', {'B' : 1}, [2], 1]}
+    update   = {'A' : [True, 'y', 'y', {'B' : 1}, {'B' : 2}, [2], (3,), 'x']}
+    assert update_config(original, update)['A'] == [
+        1, 'x', {'B' : 1}, [2], 1, 'y', 'y', {'B' : 2}, (3,)
+    ]
 
     # New keys not allowed by default but can be explicitely allowed
     original = {'A' : 1}
@@ -263,6 +866,7 @@ def test_update_config():
     assert update_config(config, update) == update
 
 def test_require_empty_dir(monkeypatch):
+    import pytest
     empty_dir = Path('path_to/empty_dir')
 
     assert not empty_dir.parent.is_dir()
@@ -281,10 +885,179 @@ def test_require_empty_dir(monkeypatch):
     (empty_dir/'file.txt').write_text('TEST\n')
     with monkeypatch.context() as m:
         with pytest.raises(FileExistsError):
-            m.setattr('user_input.request_permission', lambda _ : False)
+            m.setattr(user_input, 'request_permission', lambda _ : False)
             require_empty_dir(empty_dir)
         # User can choose to remove output directory
-        m.setattr('user_input.request_permission', lambda _ : True)
+        m.setattr(user_input, 'request_permission', lambda _ : True)
         require_empty_dir(empty_dir)
 
     shutil.rmtree(empty_dir.parent)
+
+def test_require_empty_dir_background(tmp_path, monkeypatch):
+    path = tmp_path/'outputs'
+    for i in range(50):
+        (path/f'dir{i}/sub').mkdir(parents=True)
+        (path/f'dir{i}/sub/file.txt').write_text('TEST\n')
+        (path/f'file{i}.txt').write_text('TEST\n')
+        # Deeply nested directories are split between the threads too
+        (path/f'dir0/sub/deep{i}/deeper').mkdir(parents=True)
+        (path/f'dir0/sub/deep{i}/deeper/file.txt').write_text('TEST\n')
+    assert count_dir_entries(path)[0] == 350
+
+    monkeypatch.setattr(time, 'sleep', lambda _ : None)
+    future = require_empty_dir(path, overwrite=True, background_delete=True)
+    assert path.is_dir() and not any(path.iterdir())
+    future.result()
+    assert list(tmp_path.iterdir()) == [path]
+
+    # Directories left by runs that exited mid-deletion are swept up
+    for i in range(3):
+        (tmp_path/f'.outputs.deleting-{i}/sub').mkdir(parents=True)
+        (tmp_path/f'.outputs.deleting-{i}/sub/file.txt').write_text('TEST\n')
+    (tmp_path/'.other.deleting-0').mkdir()
+    assert len(trash_dirs(path)) == 3
+    require_empty_dir(path, background_delete=True).result()
+    assert sorted(tmp_path.iterdir()) == [tmp_path/'.other.deleting-0', path]
+    assert is_trash_dir(tmp_path/'.outputs.deleting-12-345')
+    assert not is_trash_dir(tmp_path/'outputs.deleting-12-345')
+    assert require_empty_dir(path, background_delete=True) is None
+
+def test_config_cache(tmp_path):
+    path = tmp_path/'config.yml'
+    path.write_text('A : 1\nB : [1, 2]\n')
+    cache_dir = tmp_path/'cache'
+    cache = ConfigCache(cache_dir=cache_dir)
+
+    cfg = read_config(path, cache)
+    assert cfg == {'A' : 1, 'B' : [1, 2]}
+    # Returned configurations are independent copies
+    cfg['B'].append(3)
+    assert read_config(path, cache) == {'A' : 1, 'B' : [1, 2]}
+    assert len(list(cache_dir.iterdir())) == 1
+
+    # Edited files are re-read
+    path.write_text('A : 2\n')
+    assert read_config(path, cache) == {'A' : 2}
+    assert len(list(cache_dir.iterdir())) == 1
+
+    # Disk cache is shared across instances
+    other_cache = ConfigCache(cache_dir=cache_dir)
+    assert other_cache._read_disk(other_cache._key(path)) is not None
+    assert read_config(path, other_cache) == {'A' : 2}
+
+    cache.invalidate(path)
+    assert not cache._cache
+    assert not any(cache_dir.iterdir())
+
+    # Concurrent first reads all write the disk cache
+    for _ in range(5):
+        cache = ConfigCache(cache_dir=cache_dir)
+        with ThreadPoolExecutor(8) as executor:
+            cfgs = list(executor.map(cache.read, [path]*8))
+        assert cfgs == [{'A' : 2}]*8
+        assert [p.suffix for p in cache_dir.iterdir()] == ['.pickle']
+        cache.clear()
+
+def test_layered_config():
+    import pytest
+    default = {
+        'A' : 1,
+        'B' : {'X' : 2, 'Y' : [1, 2], 'Z' : {'deep' : 1}},
+        'C' : None,
+        'D' : None,
+        'E' : [{'x' : 1}],
+    }
+    updates = [
+        {'A' : 9, 'B' : {'Y' : [2, 3]}, 'C' : {'new' : 1}},
+        {'B' : {'Z' : {'deep' : 2}, 'Y' : [4]}, 'D' : [1, 2], 'E' : [{'x' : 2}]},
+    ]
+    default_deepcopy = copy.deepcopy(default)
+    updates_deepcopy = copy.deepcopy(updates)
+    expected = merge_config_files(updates, default)
+
+    cfg = LayeredConfig(default, *updates, allow_new_keys=False)
+    assert cfg == expected
+    assert cfg['B']['Y'] == [1, 2, 3, 4]
+    assert isinstance(cfg['B'], LayeredConfig)
+    assert list(cfg) == list(expected)
+    assert len(cfg['B']) == 3
+
+    # Materialized dictionary is independent of the layers
+    merged = cfg.to_dict()
+    assert type(merged['B']) is dict and merged == expected
+    merged['B']['Z']['deep'] = 0
+    merged['E'][0]['x'] = 0
+    assert (default, updates) == (default_deepcopy, updates_deepcopy)
+
+    # Overwritten dictionaries are not merged
+    cfg = cfg.new_child({'B' : None}).new_child({'B' : {'X' : 3}})
+    assert cfg['B'] == {'X' : 3}
+
+    # New keys
+    with pytest.raises(KeyError):
+        LayeredConfig(default, {'B' : {'new' : 1}}, allow_new_keys=False)
+    LayeredConfig(default, {'B' : None}, {'B' : {'new' : 1}}, allow_new_keys=False)
+    LayeredConfig(default, {'C' : {'new' : {'newer' : 1}}}, allow_new_keys=False)
+    assert LayeredConfig(default, {'new' : 1})['new'] == 1
+
+def test_parallel_map():
+    import pytest
+    items = [str(i) for i in range(20)]
+    expected = list(range(20))
+    for executor in ('serial', 'thread', 'process'):
+        results = parallel_map(int, items, executor, workers=2, chunksize=3)
+        assert list(results) == expected
+
+        with pytest.raises(TaskError, match="'x': ValueError"):
+            list(parallel_map(int, items + ['x'], executor, workers=2))
+
+    with pytest.raises(ValueError):
+        list(parallel_map(int, items, 'cluster'))
+
+def test_compile_schema():
+    import pytest
+    validate = compile_schema({
+        'A' : int,
+        'B' : {'X' : (str, None), 'Y' : [float]},
+        'C' : {'one', 'two'},
+        'D' : {... : int},
+        'E' : ([int], None),
+        'F' : lambda x : None if x > 0 else 'must be positive',
+        'H' : (int, float),
+    })
+    cfg = {
+        'A' : 1,
+        'B' : {'X' : None, 'Y' : [1.0, 2.0]},
+        'C' : 'one',
+        'D' : {'any' : 1},
+        'E' : [1],
+        'F' : 1,
+        'H' : 1.5,
+    }
+    validate(cfg)
+    validate(LayeredConfig(cfg, {'B' : {'X' : 'text'}, 'E' : None}))
+
+    cfg = {
+        'A' : '1',
+        'B' : {'Y' : [1.0, 'x'], 'Z' : 1},
+        'C' : 'three',
+        'D' : {'any' : 'x'},
+        'E' : ['x'],
+        'F' : 0,
+        'G' : None,
+        'H' : True,
+    }
+    with pytest.raises(ConfigError) as exc_info:
+        validate(cfg)
+    assert sorted(exc_info.value.errors) == sorted([
+        'A: expected int, got str',
+        'B.X: missing',
+        'B.Y[1]: expected float, got str',
+        'B.Z: unexpected key',
+        "C: 'three' not one of 'one', 'two'",
+        'D.any: expected int, got str',
+        'E: no valid option (E[0]: expected int, got str; E: expected NoneType, got list)',
+        'F: must be positive',
+        'G: unexpected key',
+        'H: expected int or float, got bool',
+    ])
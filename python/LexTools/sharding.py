@@ -0,0 +1,188 @@
+'''
+Splitting a script's inputs across independent jobs and merging their outputs
+
+Each of N jobs (e.g. on different batch nodes) processes one contiguous
+shard of the sorted inputs, saving its outputs in its own directory along
+with a manifest of the inputs it was assigned. Once all jobs are done,
+merge_shards() validates that every input was processed exactly once and
+concatenates the shard outputs.
+
+How to use:
+```
+index, count = parse_shard('3/10')
+shard_paths = shard_items(sorted(paths), index, count)
+sdir = shard_dir(odir, index, count)
+... # Process shard_paths, saving results in sdir/'scores.csv'
+write_manifest(sdir, index, count, [p.name for p in shard_paths], 'scores.csv')
+
+# Later, after all shards finished
+merge_shards(odir, 'scores.csv', key='image')
+```
+'''
+# Standard library
+import json
+import logging
+from pathlib import Path
+from typing import Sequence
+
+# Local
+if __package__:
+    from . import file_utils, result_writer
+else:
+    import file_utils
+    import result_writer
+
+# Globals
+log = logging.getLogger(__name__)
+MANIFEST = 'shard_manifest.json'
+
+################################################################################
+def parse_shard(text: str) -> tuple[int, int]:
+    '''Parse 'i/N' into the 0-based shard index i and number of shards N'''
+    index, count = (int(x) for x in text.split('/'))
+    if not 0 <= index < count:
+        raise ValueError(f'Shard index must be in [0, {count}): {text}')
+    return index, count
+
+def shard_items(items: Sequence, index: int, count: int) -> Sequence:
+    '''Contiguous shard of items, with shard sizes differing by at most one'''
+    n_items = len(items)
+    return items[index * n_items // count : (index + 1) * n_items // count]
+
+def shard_dir(odir: Path, index: int, count: int) -> Path:
+    '''Output directory of a shard'''
+    return odir/f'shard-{index:05d}-of-{count:05d}'
+
+def write_manifest(
+    sdir: Path,
+    index: int,
+    count: int,
+    inputs: list[str],
+    output: str,
+) -> None:
+    '''Record a finished shard, marking it as complete for merge_shards()
+
+    Parameters
+    ==========
+    sdir:
+        Output directory of the shard
+    index, count:
+        Shard index and number of shards
+    inputs:
+        Identifiers of all inputs assigned to the shard (e.g. file names)
+    output:
+        Result file of the shard, relative to sdir
+    '''
+    manifest = {'index' : index, 'count' : count, 'inputs' : inputs, 'output' : output}
+    with file_utils.atomic_path(sdir/MANIFEST) as tmp_path:
+        tmp_path.write_text(json.dumps(manifest))
+
+def merge_shards(odir: Path, fname: str, key: str) -> int:
+    '''Concatenate the result files of all shards in odir into odir/fname
+
+    The shards are validated as they are merged. Every shard must have a
+    manifest and its results must contain each of its inputs exactly once.
+    The merged file is only created if all shards are valid.
+
+    Parameters
+    ==========
+    odir:
+        Directory containing the shard directories
+    fname:
+        Merged result file name, relative to odir. Any result_writer format.
+    key:
+        Column identifying the input of each row
+
+    Returns
+    =======
+    Number of merged rows
+    '''
+    manifests = []
+    for path in sorted(odir.glob(f'shard-*/{MANIFEST}')):
+        manifest = json.loads(path.read_text())
+        manifest['dir'] = path.parent
+        manifests.append(manifest)
+    if not manifests:
+        raise FileNotFoundError(f'No finished shards found in {odir}')
+    count = manifests[0]['count']
+    found = [m['index'] for m in manifests if m['count'] == count]
+    if len(found) != len(manifests) or found != list(range(count)):
+        missing = sorted(set(range(count)) - set(found))
+        raise ValueError(
+            f'Expected {count} finished shards in {odir}, missing {missing}'
+            + ('' if len(found) == len(manifests) else ' and found other shard counts')
+        )
+
+    # Merge into a temporary output with the same suffix so nothing is left
+    # at the final path if validation fails
+    opath = odir/fname
+    writer = None
+    n_rows = 0
+    with file_utils.atomic_path(opath) as tmp_path:
+        for manifest in manifests:
+            rows = list(result_writer.read_rows(manifest['dir']/manifest['output']))
+            _check_shard_rows(manifest, rows, key)
+            if rows and writer is None:
+                writer = result_writer.open_writer(tmp_path, list(rows[0]))
+            if rows:
+                writer.write_rows(rows)
+            n_rows += len(rows)
+        if writer is None:
+            writer = result_writer.open_writer(tmp_path, [key])
+        writer.close()
+    log.info('Merged %d rows from %d shards into %s', n_rows, count, opath)
+    return n_rows
+
+def _check_shard_rows(manifest: dict, rows: list[dict], key: str) -> None:
+    expected = set(manifest['inputs'])
+    found = [row[key] for row in rows]
+    missing = expected.difference(found)
+    unexpected = set(found).difference(expected)
+    errors = []
+    if missing:
+        errors.append(f'{len(missing)} missing (e.g. {min(missing)})')
+    if unexpected:
+        errors.append(f'{len(unexpected)} unexpected (e.g. {min(unexpected)})')
+    if len(found) != len(set(found)):
+        errors.append(f'{len(found) - len(set(found))} duplicated')
+    if errors:
+        raise ValueError(f'Invalid results in {manifest["dir"]}: ' + ', '.join(errors))
+
+################################################################################
+# PyTests to be moved into tests/ if added to project
+def test_shard_items():
+    import pytest
+    items = list(range(10))
+    shards = [shard_items(items, i, 3) for i in range(3)]
+    assert shards == [[0, 1, 2], [3, 4, 5], [6, 7, 8, 9]]
+    assert [shard_items(items[:2], i, 3) for i in range(3)] == [[], [0], [1]]
+    assert parse_shard('2/3') == (2, 3)
+    with pytest.raises(ValueError):
+        parse_shard('3/3')
+
+def test_merge_shards(tmp_path):
+    import pytest
+    names = [f'image{i}.png' for i in range(7)]
+    for index in range(3):
+        sdir = shard_dir(tmp_path, index, 3)
+        sdir.mkdir()
+        inputs = shard_items(names, index, 3)
+        with result_writer.open_writer(sdir/'scores.csv', ['image', 'score']) as writer:
+            writer.write_rows({'image' : name, 'score' : 1.5} for name in inputs)
+        if index != 1:
+            write_manifest(sdir, index, 3, inputs, 'scores.csv')
+
+    with pytest.raises(ValueError, match=r'missing \[1\]'):
+        merge_shards(tmp_path, 'scores.csv', 'image')
+
+    # Incomplete results
+    sdir = shard_dir(tmp_path, 1, 3)
+    write_manifest(sdir, 1, 3, shard_items(names, 1, 3) + ['extra.png'], 'scores.csv')
+    with pytest.raises(ValueError, match='1 missing'):
+        merge_shards(tmp_path, 'scores.csv', 'image')
+    assert not list(tmp_path.glob('*scores.csv*'))
+
+    write_manifest(sdir, 1, 3, shard_items(names, 1, 3), 'scores.csv')
+    assert merge_shards(tmp_path, 'scores.csv', 'image') == 7
+    rows = list(result_writer.read_rows(tmp_path/'scores.csv'))
+    assert [row['image'] for row in rows] == names
@@ -31,6 +31,17 @@ class Stopwatch():
     def clear(self):
         self.timers = {}
 
+    def to_dict(self):
+        '''Seconds accumulated by each timer, including running timers'''
+        now = perf_counter()
+        times = {}
+        for key, timer in self.timers.items():
+            if key.endswith('_START'):
+                continue
+            start = self.timers.get(f'{key}_START')
+            times[key] = timer if start is None else timer + now - start
+        return times
+
     def summary(self):
         # TODO: Allow summary() to be called multiple times
         # Currently summary() is meant to be called after all stopwatches are stopped
@@ -39,7 +50,7 @@ class Stopwatch():
         self.stop('TOTAL')
         for key in tuple(self.timers.keys()):
             if key.endswith('_START'):
-                base_key = key.rstrip('_START')
+                base_key = key.removesuffix('_START')
                 log.warning('Stopwatch timer not stopped : %s', base_key)
                 self.stop(base_key)
         s = f'Total Time : {self.timers["TOTAL"]:.{self.prec}f}s\n'
@@ -0,0 +1,36 @@
+'''
+YAML reading and writing using the LibYAML C bindings when available
+
+yaml.safe_load() and yaml.safe_dump() always use the pure python
+implementation, which is many times slower than LibYAML. The functions below
+are drop-in replacements that fall back on the pure python implementation if
+PyYAML was installed without LibYAML.
+'''
+# 3rd party
+import yaml
+
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+    LIBYAML = True
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
+    LIBYAML = False
+
+def safe_load(stream):
+    '''Same as yaml.safe_load()'''
+    return yaml.load(stream, Loader=SafeLoader)
+
+def safe_dump(data, stream=None, **kwargs):
+    '''Same as yaml.safe_dump()
+
+    LibYAML writes an invalid "!" tag for quoted non-string scalars in flow
+    style (e.g. timestamps in `[...]`), loading back as strings. Therefore,
+    LibYAML is only used for block style, the yaml.safe_dump() default. The
+    only other difference is LibYAML omits the "..." document end marker
+    after a top-level scalar.
+    '''
+    if kwargs.get('default_flow_style', False) is False:
+        dumper = SafeDumper
+    else:
+        dumper = yaml.SafeDumper
+    return yaml.dump(data, stream, Dumper=dumper, **kwargs)
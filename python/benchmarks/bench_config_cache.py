@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+'''
+Benchmark reading large YAML configuration files with and without ConfigCache
+
+Usage: python benchmarks/bench_config_cache.py [-n N_SAMPLES ...]
+'''
+# Standard library
+import argparse
+from pathlib import Path
+import sys
+import tempfile
+import timeit
+
+# Local
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]/'LexTools'))
+import scripting
+
+################################################################################
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '-n', '--n-samples',
+        type = int,
+        nargs = '+',
+        default = [100, 1_000, 10_000],
+        help = 'Number of samples in the generated configuration',
+    )
+    args = parser.parse_args()
+
+    print(f'{"samples":>8} {"size":>8} | {"no cache":>10} {"memory":>10} {"disk":>10}')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = Path(tmp_dir)
+        for n_samples in args.n_samples:
+            path = tmp_dir/f'config_{n_samples}.yml'
+            write_large_config(path, n_samples)
+
+            memory_cache = scripting.ConfigCache()
+            memory_cache.read(path)
+            disk_cache = scripting.ConfigCache(cache_dir=tmp_dir/'cache')
+            disk_cache.read(path)
+            def read_from_disk_cache():
+                disk_cache._cache.clear()
+                return disk_cache.read(path)
+
+            times = [
+                time_call(lambda: scripting.read_config(path)),
+                time_call(lambda: memory_cache.read(path)),
+                time_call(read_from_disk_cache),
+            ]
+            size = path.stat().st_size / 1e6
+            print(
+                f'{n_samples:>8} {size:>6.1f}MB | '
+                + ' '.join(f'{t*1e3:>8.2f}ms' for t in times)
+            )
+
+def write_large_config(path: Path, n_samples: int) -> None:
+    lines = ['samples:']
+    for i in range(n_samples):
+        lines += [
+            f'    - did: mc16_13TeV:mc16_13TeV.{i:06d}.Sample_{i}.deriv.DAOD',
+            f'      cross_section: {1.5 * i}',
+            f'      tags: [e{i}, s{i}, r{i}, p{i}]',
+            f'      options: {{enabled: true, weight: {i % 7}}}',
+        ]
+    path.write_text('\n'.join(lines) + '\n')
+
+def time_call(func, min_time: float = 0.5) -> float:
+    '''Best time per call (sec)'''
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    return min(timer.repeat(repeat=3, number=number)) / number
+
+if __name__ == '__main__':
+    main()
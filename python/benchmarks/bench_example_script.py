@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+'''
+Benchmark example_script end to end under each execution mode
+
+Synthesizes a scaled-up input directory from tests/test_example_script/inputs
+and runs example_script in a subprocess for each configuration, recording
+wall time, throughput, peak RSS of the largest process and the per-stage
+Stopwatch times the script saves in timings.json.
+
+Usage: python benchmarks/bench_example_script.py [-n N_IMAGES] [-o RESULTS]
+'''
+# Standard library
+import argparse
+import json
+import os
+from pathlib import Path
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+# 3rd party
+import yaml
+
+# Globals
+BENCH_DIR = Path(__file__).resolve().parent
+PACKAGE_DIR = BENCH_DIR.parent
+SCRIPT = PACKAGE_DIR/'LexTools/example_script.py'
+INPUT_DIR = PACKAGE_DIR/'tests/test_example_script/inputs'
+
+# Configuration layered on the default configuration of each benchmark
+CONFIGS = {
+    'serial'          : {'executor' : 'serial'},
+    'serial_batch32'  : {'executor' : 'serial', 'batch_size' : 32},
+    'thread'          : {'executor' : 'thread'},
+    'thread_batch32'  : {'executor' : 'thread', 'batch_size' : 32},
+    'process'         : {'executor' : 'process', 'chunksize' : 16},
+    'process_batch32' : {'executor' : 'process', 'batch_size' : 32},
+}
+
+################################################################################
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '-n', '--n-images',
+        type = int,
+        default = 5_000,
+        help = 'Number of synthesized input images',
+    )
+    parser.add_argument(
+        '-c', '--configs',
+        nargs = '+',
+        choices = list(CONFIGS),
+        default = list(CONFIGS),
+        help = 'Execution modes to benchmark',
+    )
+    parser.add_argument(
+        '-r', '--repeat',
+        type = int,
+        default = 1,
+        help = 'Runs of each configuration',
+    )
+    parser.add_argument(
+        '-o', '--output',
+        type = Path,
+        default = BENCH_DIR/'results/bench_example_script.json',
+        help = 'Results file',
+    )
+    args = parser.parse_args()
+
+    results = {
+        'python'   : sys.version,
+        'platform' : platform.platform(),
+        'cpus'     : os.cpu_count(),
+        'n_images' : args.n_images,
+        'runs'     : [],
+    }
+    print(f'{"config":>16} | {"time":>8} {"images/s":>9} {"peak RSS":>9}')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = Path(tmp_dir)
+        img_dir = synthesize_inputs(tmp_dir/'inputs', args.n_images)
+        for name in args.configs:
+            for i in range(args.repeat):
+                run = run_config(name, img_dir, tmp_dir/f'{name}_{i}')
+                results['runs'].append(run)
+                print(
+                    f'{name:>16} | {run["wall_time"]:>7.2f}s '
+                    f'{run["throughput"]:>9.0f} {run["peak_rss_mb"]:>7.0f}MB'
+                )
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(results, indent=4))
+    print(f'Results saved: {args.output}')
+
+def synthesize_inputs(img_dir: Path, n_images: int) -> Path:
+    '''Directory of n_images links to the test images'''
+    img_dir.mkdir(parents=True)
+    images = sorted(INPUT_DIR.glob('*.png'))
+    for i in range(n_images):
+        os.symlink(images[i % len(images)], img_dir/f'image{i:07d}.png')
+    return img_dir
+
+def run_config(name: str, img_dir: Path, run_dir: Path) -> dict:
+    '''Run example_script with one benchmark configuration'''
+    run_dir.mkdir()
+    cfg_path = run_dir/'config.yml'
+    odir = run_dir/'outputs'
+    cfg = {
+        'inputs' : {'image_dir' : str(img_dir)},
+        'outputs' : {
+            'logging' : {'level' : 'WARNING'},
+        },
+        'execution' : CONFIGS[name],
+    }
+    cfg_path.write_text(yaml.safe_dump(cfg))
+
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, SCRIPT, '-c', cfg_path, '-o', odir], cwd=PACKAGE_DIR
+    )
+    # wait4 reports the peak RSS of the largest of the script and its
+    # waited-for child processes (e.g. a process pool)
+    _, status, rusage = os.wait4(proc.pid, 0)
+    wall_time = time.perf_counter() - start
+    returncode = proc.returncode = os.waitstatus_to_exitcode(status)
+    if returncode != 0:
+        raise RuntimeError(f'example_script failed with exit code {returncode}: {name}')
+
+    timings_path = odir/'timings.json'
+    n_images = len(list(img_dir.iterdir()))
+    return {
+        'config'      : name,
+        'execution'   : CONFIGS[name],
+        'wall_time'   : wall_time,
+        'throughput'  : n_images / wall_time,
+        'peak_rss_mb' : rusage.ru_maxrss / 1024, # KiB on Linux
+        'user_time'   : rusage.ru_utime,
+        'system_time' : rusage.ru_stime,
+        'timings'     : json.loads(timings_path.read_text()),
+    }
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+'''
+Benchmark preprocessing and scoring in example_script
+
+Compares the previous nested-list implementation against the NumPy
+implementation applied to one image at a time and to a stacked batch.
+
+Usage: python benchmarks/bench_preprocess.py [-s SIZE ...] [-n N_IMAGES]
+'''
+# Standard library
+import argparse
+from pathlib import Path
+import sys
+
+# 3rd party
+import numpy as np
+
+# Local
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]/'LexTools'))
+import example_script
+from bench_config_cache import time_call
+
+################################################################################
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '-s', '--sizes',
+        type = int,
+        nargs = '+',
+        default = [32, 128, 512],
+        help = 'Height and width of the square images',
+    )
+    parser.add_argument(
+        '-n', '--n-images',
+        type = int,
+        default = 32,
+        help = 'Number of images per batch',
+    )
+    parser.add_argument(
+        '--max-list-size',
+        type = int,
+        default = 512,
+        help = 'Skip the list implementation for larger images',
+    )
+    args = parser.parse_args()
+
+    print(f'Time per image for {args.n_images} images')
+    print(f'{"size":>6} | {"lists":>10} {"numpy":>10} {"batched":>10} {"speedup":>8}')
+    rng = np.random.default_rng(0)
+    for size in args.sizes:
+        images = rng.integers(0, 256, (args.n_images, size, size), dtype=np.uint8)
+        list_images = images.tolist()
+
+        def run_numpy():
+            return [
+                example_script.compute_score(example_script.preprocess(img))
+                for img in images
+            ]
+        def run_batched():
+            preprocessed = example_script.preprocess(images)
+            return example_script.compute_scores(preprocessed).tolist()
+
+        np.testing.assert_allclose(run_numpy(), run_batched())
+        numpy_time = time_call(run_numpy) / args.n_images
+        batched_time = time_call(run_batched) / args.n_images
+        if size <= args.max_list_size:
+            def run_lists():
+                return [list_score(list_preprocess(img)) for img in list_images]
+            np.testing.assert_allclose(run_lists(), run_batched(), rtol=1e-5)
+            list_time = time_call(run_lists) / args.n_images
+            print(
+                f'{size:>6} | {list_time*1e3:>8.3f}ms {numpy_time*1e3:>8.3f}ms '
+                f'{batched_time*1e3:>8.3f}ms {list_time/batched_time:>7.0f}x'
+            )
+        else:
+            print(
+                f'{size:>6} | {"skipped":>10} {numpy_time*1e3:>8.3f}ms '
+                f'{batched_time*1e3:>8.3f}ms'
+            )
+
+def list_preprocess(img: list) -> list:
+    '''Previous implementation of example_script.preprocess'''
+    return [[pixel/255 for pixel in row] for row in img]
+
+def list_score(img: list) -> float:
+    '''Previous implementation of example_script.compute_score'''
+    return sum(sum(row) for row in img)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+'''
+Benchmark the digit utilities in pytools against str() and int() conversion
+
+Times each function on integers of increasing size and reports the scaling
+exponent between consecutive sizes (2 for quadratic, 1 for linear). The
+str() and int() baselines are quadratic so are skipped for large sizes.
+
+Usage: python benchmarks/bench_pytools.py [-d N_DIGITS ...]
+'''
+# Standard library
+import argparse
+import math
+from pathlib import Path
+import random
+import sys
+
+# Local
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]/'LexTools'))
+import pytools
+from bench_config_cache import time_call
+
+# Globals
+# Repeated calls of ndigits reuse the cached power of ten
+BENCHMARKS = {
+    'ndigits' : (
+        lambda n, digits: pytools.ndigits(n),
+        lambda n, digits: len(str(n)),
+    ),
+    'split_int' : (
+        lambda n, digits: pytools.split_int(n),
+        lambda n, digits: [int(c) for c in str(n)],
+    ),
+    'join_ints' : (
+        lambda n, digits: pytools.join_ints(digits),
+        lambda n, digits: int(''.join(map(str, digits))),
+    ),
+    'get_nth_digit' : (
+        lambda n, digits: pytools.get_nth_digit(n, len(digits) // 2),
+        lambda n, digits: int(str(n)[len(digits) // 2]),
+    ),
+}
+
+################################################################################
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '-d', '--n-digits',
+        type = int,
+        nargs = '+',
+        default = [1_000, 10_000, 100_000, 1_000_000],
+        help = 'Number of digits of the benchmarked integers',
+    )
+    parser.add_argument(
+        '--max-str-digits',
+        type = int,
+        default = 100_000,
+        help = 'Skip the str() and int() baselines for larger integers',
+    )
+    args = parser.parse_args()
+    # Lift the int <-> str limit for the baselines
+    sys.set_int_max_str_digits(0)
+
+    random.seed(0)
+    values = {}
+    for n_digits in args.n_digits:
+        digits = [random.randint(1, 9)] + random.choices(range(10), k=n_digits-1)
+        values[n_digits] = (pytools.join_ints(digits), digits)
+
+    print(f'{"function":>14} {"digits":>10} | {"pytools":>10} {"str/int":>10} {"scaling":>8}')
+    for name, (func, baseline) in BENCHMARKS.items():
+        previous = None
+        for n_digits, (n, digits) in values.items():
+            time = time_call(lambda: func(n, digits), min_time=0.2)
+            baseline_time = math.nan
+            if n_digits <= args.max_str_digits:
+                baseline_time = time_call(lambda: baseline(n, digits), min_time=0.2)
+            scaling = math.nan
+            if previous is not None:
+                scaling = math.log(time / previous[1]) / math.log(n_digits / previous[0])
+            previous = (n_digits, time)
+            print(
+                f'{name:>14} {n_digits:>10} | {time*1e3:>8.2f}ms '
+                f'{baseline_time*1e3:>8.2f}ms {scaling:>8.2f}'
+            )
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+'''
+Benchmark scaling of list merging in scripting.update_config
+
+Compares the set-based merge against the previous `x not in original_list`
+loop for lists of sample DIDs.
+
+Usage: python benchmarks/bench_update_config.py [-n N_ELEMENTS ...]
+'''
+# Standard library
+import argparse
+from pathlib import Path
+import sys
+
+# Local
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]/'LexTools'))
+import scripting
+from bench_config_cache import time_call
+
+################################################################################
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '-n', '--n-elements',
+        type = int,
+        nargs = '+',
+        default = [1_000, 10_000, 100_000, 1_000_000],
+        help = 'Number of elements in each list',
+    )
+    parser.add_argument(
+        '--max-quadratic',
+        type = int,
+        default = 30_000,
+        help = 'Skip the quadratic implementation for larger lists',
+    )
+    args = parser.parse_args()
+
+    print(f'{"elements":>9} | {"quadratic":>11} {"set-based":>11} {"speedup":>8}')
+    for n in args.n_elements:
+        # Half of the update overlaps with the original
+        original = {'samples' : [did(i) for i in range(n)]}
+        update = {'samples' : [did(i) for i in range(n//2, n + n//2)]}
+        def merge():
+            return scripting.update_config(original, update)
+
+        new_time = time_call(merge)
+        if n <= args.max_quadratic:
+            assert quadratic_merge(original, update) == merge()
+            old_time = time_call(lambda: quadratic_merge(original, update))
+            print(
+                f'{n:>9} | {old_time*1e3:>9.2f}ms {new_time*1e3:>9.2f}ms '
+                f'{old_time/new_time:>7.0f}x'
+            )
+        else:
+            print(f'{n:>9} | {"skipped":>11} {new_time*1e3:>9.2f}ms')
+
+def did(i: int) -> str:
+    return f'mc16_13TeV:mc16_13TeV.{i:07d}.Sample.deriv.DAOD_PHYS.e1234_s5678_r9012'
+
+def quadratic_merge(original: dict, update: dict) -> dict:
+    '''Previous implementation of the default list merge'''
+    original_list = original['samples']
+    merged_list = original_list.copy()
+    for x in update['samples']:
+        if x not in original_list:
+            merged_list.append(x)
+    return {'samples' : merged_list}
+
+if __name__ == '__main__':
+    main()
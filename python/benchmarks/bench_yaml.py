@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+'''
+Benchmark yaml_utils (LibYAML when available) against pure python PyYAML
+
+Usage: python benchmarks/bench_yaml.py [-n N_SAMPLES ...]
+'''
+# Standard library
+import argparse
+from pathlib import Path
+import sys
+import tempfile
+
+# 3rd party
+import yaml
+
+# Local
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]/'LexTools'))
+import yaml_utils
+from bench_config_cache import write_large_config, time_call
+
+################################################################################
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '-n', '--n-samples',
+        type = int,
+        nargs = '+',
+        default = [100, 1_000, 10_000],
+        help = 'Number of samples in the generated configuration',
+    )
+    args = parser.parse_args()
+
+    print(f'LibYAML available: {yaml_utils.LIBYAML}')
+    print(
+        f'{"samples":>8} | {"load":>10} {"load C":>10} {"speedup":>7} | '
+        f'{"dump":>10} {"dump C":>10} {"speedup":>7}'
+    )
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for n_samples in args.n_samples:
+            path = Path(tmp_dir)/f'config_{n_samples}.yml'
+            write_large_config(path, n_samples)
+            text = path.read_text()
+            cfg = yaml.safe_load(text)
+            assert yaml_utils.safe_load(text) == cfg
+
+            load_py = time_call(lambda: yaml.safe_load(text))
+            load_c = time_call(lambda: yaml_utils.safe_load(text))
+            dump_py = time_call(lambda: yaml.safe_dump(cfg))
+            dump_c = time_call(lambda: yaml_utils.safe_dump(cfg))
+            print(
+                f'{n_samples:>8} | '
+                f'{load_py*1e3:>8.2f}ms {load_c*1e3:>8.2f}ms {load_py/load_c:>6.1f}x | '
+                f'{dump_py*1e3:>8.2f}ms {dump_c*1e3:>8.2f}ms {dump_py/dump_c:>6.1f}x'
+            )
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+import shutil
+import sys
+import time
+from pathlib import Path
+import pytest
+
+np = pytest.importorskip('numpy')
+import LexTools.example_script as example_script
+import LexTools.logging_utils as logging_utils
+import LexTools.run_cache as run_cache
+import LexTools.scripting as scripting
+
+INPUT_DIR = Path(__file__).parent/'test_example_script/inputs'
+
+def run_main(monkeypatch, *configs):
+    monkeypatch.setattr(sys, 'argv', ['example_script.py', '-c', *map(str, configs)])
+    # Capture the version control state of each run, as separate programs do
+    monkeypatch.setattr(logging_utils, '_VERSION_CONTROL_CAPTURE', None)
+    example_script.main()
+
+def test_run_cache(tmp_path, monkeypatch):
+    # Outputs inside the repository are listed as untracked by git
+    odir = INPUT_DIR.parent/'outputs_test_run_cache'
+    cfg_path = tmp_path/'config.yml'
+    cfg_path.write_text(
+        'inputs:\n'
+        f'    image_dir: {INPUT_DIR}\n'
+        'outputs:\n'
+        f'    dir: {odir}\n'
+        '    overwrite: True\n'
+        f'    run_cache: {{dir: {tmp_path/"cache"}, max_age_days: null, max_bytes: null}}\n'
+    )
+    restored = []
+    restore = run_cache.RunCache.restore
+    def spy(self, key, odir):
+        restored.append(restore(self, key, odir))
+        return restored[-1]
+    monkeypatch.setattr(run_cache.RunCache, 'restore', spy)
+    monkeypatch.setattr(time, 'sleep', lambda _ : None)
+    monkeypatch.setattr(sys, 'excepthook', sys.excepthook)
+
+    try:
+        run_main(monkeypatch, cfg_path)
+        scores = (odir/'scores.csv').read_text()
+        # The first outputs are renamed aside while the second run hashes the code
+        run_main(monkeypatch, cfg_path)
+        assert restored == [False, True]
+        assert (odir/'scores.csv').read_text() == scores
+    finally:
+        for path in [odir, *scripting.trash_dirs(odir)]:
+            shutil.rmtree(path, ignore_errors=True)
+
+def test_scoring_matches_lists():
+    # Nested list implementation the NumPy functions replaced
+    def list_score(img):
+        return sum(sum(pixel/255 for pixel in row) for row in img)
+
+    rng = np.random.default_rng(0)
+    for shape in [(3, 3), (5, 7), (64, 300)]:
+        images = rng.integers(0, 256, (4, *shape), dtype=np.uint8)
+        expected = [list_score(img) for img in images.tolist()]
+        scores = [
+            example_script.compute_score(example_script.preprocess(img))
+            for img in images
+        ]
+        batch_scores = example_script.compute_scores(example_script.preprocess(images))
+        assert batch_scores.tolist() == scores
+        # NumPy sums rows of 8 or more pixels pairwise, changing the rounding
+        if shape[1] < 8:
+            assert scores == expected
+        else:
+            assert scores == pytest.approx(expected, rel=1e-12)
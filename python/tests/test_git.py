@@ -0,0 +1,73 @@
+import subprocess
+import LexTools.git as git
+
+def run(args, cwd):
+    return subprocess.run(
+        ['git', '-c', 'user.name=test', '-c', 'user.email=test@test', *args],
+        cwd=cwd, check=True, capture_output=True, text=True,
+    ).stdout.strip()
+
+def test_read_head(tmp_path):
+    run(['init', '-q', '-b', 'main'], tmp_path)
+    assert git.read_head(tmp_path) == (None, 'main')
+
+    (tmp_path/'file.txt').write_text('TEST\n')
+    run(['add', 'file.txt'], tmp_path)
+    run(['commit', '-q', '-m', 'First'], tmp_path)
+    head = git.read_head(tmp_path/'file.txt')
+    assert head == (run(['rev-parse', 'HEAD'], tmp_path), 'main')
+    assert git.read_head(tmp_path) is head # cached
+    assert git.get_hash(tmp_path) == head.hash
+
+    # New commit invalidates cache
+    run(['commit', '-q', '--allow-empty', '-m', 'Second'], tmp_path)
+    assert git.read_head(tmp_path).hash == run(['rev-parse', 'HEAD'], tmp_path)
+
+    # Packed refs
+    run(['pack-refs', '--all'], tmp_path)
+    assert not (tmp_path/'.git/refs/heads/main').exists()
+    assert git.read_head(tmp_path).hash == run(['rev-parse', 'HEAD'], tmp_path)
+
+    # Detached HEAD
+    run(['checkout', '-q', 'HEAD~1'], tmp_path)
+    assert git.read_head(tmp_path) == (run(['rev-parse', 'HEAD'], tmp_path), None)
+
+    # Linked worktree
+    worktree = tmp_path/'worktree'
+    run(['worktree', 'add', '-q', '-b', 'other', str(worktree), 'main'], tmp_path)
+    assert git.read_head(worktree) == (run(['rev-parse', 'main'], tmp_path), 'other')
+
+def test_snapshot(tmp_path):
+    diff_path = tmp_path/'diff.patch'
+    tmp_path = tmp_path/'repo'
+    tmp_path.mkdir()
+    run(['init', '-q', '-b', 'main'], tmp_path)
+    for name in ('a.txt', 'b.txt', 'c d.txt'):
+        (tmp_path/name).write_text(f'{name}\n')
+    run(['add', '.'], tmp_path)
+    run(['commit', '-q', '-m', 'First'], tmp_path)
+
+    (tmp_path/'a.txt').write_text('Changed\n')
+    (tmp_path/'c d.txt').write_text('Changed\n')
+    run(['mv', 'b.txt', 'e.txt'], tmp_path)
+    (tmp_path/'new.txt').write_text('New\n')
+    snap = git.snapshot(tmp_path, diff_path=diff_path)
+
+    assert snap.hash == run(['rev-parse', 'HEAD'], tmp_path)
+    assert snap.branch == 'main'
+    assert snap.upstream is None
+    assert snap.dirty == {'a.txt' : '.M', 'c d.txt' : '.M', 'e.txt' : 'R.'}
+    assert snap.untracked == ['new.txt']
+    # Staged changes are included
+    assert diff_path.read_text().strip() == run(['diff', 'HEAD'], tmp_path)
+    assert 'e.txt' in diff_path.read_text()
+
+    # Repository without commits
+    tmp_path = tmp_path.with_name('empty_repo')
+    tmp_path.mkdir()
+    run(['init', '-q', '-b', 'main'], tmp_path)
+    (tmp_path/'a.txt').write_text('a.txt\n')
+    run(['add', 'a.txt'], tmp_path)
+    snap = git.snapshot(tmp_path, diff_path=diff_path)
+    assert snap.hash is None and snap.dirty == {'a.txt' : 'A.'}
+    assert 'a.txt' in diff_path.read_text()
@@ -0,0 +1,51 @@
+''' Import-time budget of the LexTools package '''
+from pathlib import Path
+import subprocess
+import sys
+
+import pytest
+
+PACKAGE_DIR = Path(__file__).resolve().parents[1]
+BUDGET_US = 50_000 # Generous for slow machines, typically well under 1ms
+HEAVY_MODULES = {'yaml', 'psutil', 'pytest', 'numpy'}
+
+def import_times(statement: str) -> dict[str, int]:
+    ''' Cumulative import time in microseconds of each module imported '''
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        cwd=PACKAGE_DIR, check=True, capture_output=True, text=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        # e.g. "import time:       123 |        456 |   LexTools"
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+def test_package_import_time():
+    times = import_times('import LexTools')
+    assert times['LexTools'] < BUDGET_US
+    assert not HEAVY_MODULES.intersection(times)
+
+def test_lazy_submodules():
+    import LexTools
+    assert 'scripting' in dir(LexTools)
+    assert LexTools.string_tools.strip_ansi_escape('\x1b[1mA\x1b[0m') == 'A'
+    with pytest.raises(AttributeError):
+        LexTools.missing
+
+    # Test-only imports are not pulled in by library modules
+    times = import_times('import LexTools.scripting')
+    assert 'yaml' in times and 'pytest' not in times
+
+def test_missing_dependency_reported():
+    # Errors importing a dependency are not hidden by the sibling imports
+    result = subprocess.run(
+        [sys.executable, '-c', "import sys; sys.modules['numpy'] = None; import LexTools.array_cache"],
+        cwd=PACKAGE_DIR, capture_output=True, text=True,
+    )
+    assert result.returncode != 0
+    assert "import of numpy halted" in result.stderr
+    assert "No module named 'run_cache'" not in result.stderr
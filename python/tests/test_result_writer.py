@@ -0,0 +1,43 @@
+import LexTools.result_writer as result_writer
+import pytest
+
+@pytest.mark.parametrize('suffix', ['.csv', '.jsonl', '.parquet'])
+def test_writer(tmp_path, suffix):
+    if suffix == '.parquet':
+        pytest.importorskip('pyarrow')
+    path = tmp_path/f'scores{suffix}'
+    rows = [{'image' : f'image{i}.png', 'score' : i / 4} for i in range(10)]
+    with result_writer.open_writer(path, ['image', 'score'], flush_every=3) as writer:
+        writer.write_rows(rows[:4])
+    assert writer.n_rows == 4
+
+    # Resume, with the buffered rows lost by a crash not written
+    writer = result_writer.open_writer(path, ['image', 'score'], flush_every=3, append=True)
+    writer.write_rows(rows[4:8])
+    del writer
+    written = list(result_writer.read_rows(path))
+    assert [row['image'] for row in written] == [row['image'] for row in rows[:7]]
+    if suffix != '.csv':
+        assert written == rows[:7]
+
+    # Replace existing output
+    with result_writer.open_writer(path, ['image', 'score']) as writer:
+        writer.write(rows[0])
+    assert len(list(result_writer.read_rows(path))) == 1
+
+def test_partial_line(tmp_path):
+    path = tmp_path/'scores.csv'
+    path.write_text('image,score\na.png,1.0\nb.png,2')
+    assert list(result_writer.read_rows(path)) == [{'image' : 'a.png', 'score' : '1.0'}]
+    with result_writer.open_writer(path, ['image', 'score'], append=True) as writer:
+        writer.write({'image' : 'b.png', 'score' : 2.5})
+    assert path.read_text() == 'image,score\na.png,1.0\nb.png,2.5\n'
+
+    # Crash before the header was written
+    path.write_text('ima')
+    with result_writer.open_writer(path, ['image', 'score'], append=True) as writer:
+        writer.write({'image' : 'a.png', 'score' : 1.0})
+    assert path.read_text() == 'image,score\na.png,1.0\n'
+
+    with pytest.raises(ValueError):
+        result_writer.open_writer(tmp_path/'scores.txt', ['image'])
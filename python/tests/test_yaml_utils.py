@@ -0,0 +1,80 @@
+''' Parity tests of LexTools.yaml_utils against the pure python PyYAML '''
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+import math
+
+import pytest
+import yaml
+import LexTools.yaml_utils as yaml_utils
+
+INPUTS_DIR = Path(__file__).parent/'test_example_script/inputs'
+
+DOCUMENTS = [
+    'A : 1',
+    'A : [1, 2.5, -3e-4, .inf, -.inf, 0x1F, 0o17, 1_000]',
+    'A : [true, false, yes, no, on, off, null, ~, ""]',
+    'A : [2001-12-14, 2001-12-14t21:59:43.10-05:00, 2001-12-14 21:59:43.10]',
+    'A : [\'single\', "double \\t \\u00e9", plain text, "1", "null"]',
+    'A : |\n    literal\n    block\nB : >\n    folded\n    block\n',
+    'base : &base {X : 1, Y : [1, 2]}\nderived :\n    <<: *base\n    Y : 3\n',
+    'A : {1 : one, 2.5 : two, null : three, true : four}',
+    '- [nested, [lists, [of, [lists]]]]\n- {a : {b : {c : {}}}}',
+    '!!set {a, b, c}',
+    '# Only a comment',
+    '',
+    *(path.read_text() for path in sorted(INPUTS_DIR.glob('*.yml'))),
+]
+
+DATA = [
+    {'A' : 1, 'B' : [1, 2.5, None, True], 'C' : {'D' : 'text'}},
+    {'float' : [0.1, 1e300, -0.0, math.inf, -math.inf]},
+    {'str' : ['', ' leading', 'trailing ', 'multi\nline', 'é', '1', 'null', "'"]},
+    {'dates' : [date(2001, 12, 14), datetime(2001, 12, 14, 21, 59, 43, 100)]},
+    {'tz' : datetime(2001, 12, 14, 21, 59, 43, tzinfo=timezone(timedelta(hours=-5)))},
+    {'binary' : b'\x00\x01\xff'},
+    {'shared' : [[1, 2]] * 2},
+    {'long' : 'word ' * 100},
+    [],
+    None,
+]
+
+@pytest.mark.parametrize('document', DOCUMENTS)
+def test_load_parity(document):
+    expected = yaml.safe_load(document)
+    assert yaml_utils.safe_load(document) == expected
+    # Streams and str behave the same
+    assert yaml_utils.safe_load(document.encode()) == expected
+
+def test_load_nan():
+    assert math.isnan(yaml_utils.safe_load('.nan'))
+
+@pytest.mark.parametrize('data', DATA)
+@pytest.mark.parametrize('kwargs', [
+    {},
+    {'sort_keys' : False},
+    {'default_flow_style' : True},
+    {'default_flow_style' : None},
+    {'allow_unicode' : True, 'width' : 40, 'indent' : 4},
+])
+def test_dump_parity(data, kwargs):
+    dumped = yaml_utils.safe_dump(data, **kwargs)
+    expected = yaml.safe_dump(data, **kwargs)
+    if isinstance(data, (list, dict)):
+        assert dumped == expected
+    else:
+        # LibYAML does not write the document end marker for scalars
+        assert dumped in (expected, expected.removesuffix('...\n'))
+    assert yaml_utils.safe_load(dumped) == data
+
+def test_dump_stream(tmp_path):
+    data = DATA[0]
+    opath = tmp_path/'data.yml'
+    with opath.open('w') as ofile:
+        assert yaml_utils.safe_dump(data, ofile) is None
+    assert opath.read_text() == yaml.safe_dump(data)
+
+def test_unsafe_tags_rejected():
+    with pytest.raises(yaml.constructor.ConstructorError):
+        yaml_utils.safe_load('!!python/object/apply:os.system ["ls"]')
+    with pytest.raises(yaml.representer.RepresenterError):
+        yaml_utils.safe_dump({'path' : Path('a')})